@@ -1,54 +1,218 @@
+import time
+_T0 = time.perf_counter()
+
 from flask import Flask, render_template, request, redirect, url_for, session
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import delete, inspect as sa_inspect, text
+from sqlalchemy.exc import SQLAlchemyError
 from models import db, User, Message
 from datetime import datetime, timedelta
-import os
+import os, sys, secrets
 from moderators import moderators
 from datetime import datetime, timedelta
-from flask import jsonify
-from games_service import init_socketio as init_games
+from flask import jsonify, Response, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+import click
+import auth_pool
+import ratelimit
+from presence import IdleDetector, AFK_AFTER, PresenceRegistry, MemoryBackend, make_backend
+from ratelimit import limited
+from chat_rooms import GLOBAL, RoomHistory, channel_for, known, message_payload
+from chat_render import IMAGE_TAG, render
+from conditional import Version, conditional
+import export
+import tracing
+import replicas
 
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
-
-# ✅ Railway sets this automatically
-DATABASE_URL = os.environ.get("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not set. Please check your Railway environment variables.")
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Behind Railway's edge proxy remote_addr is the proxy; take the client address
+# (and scheme/host) from the X-Forwarded-* headers it sets. 0 when serving directly.
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 1))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES,
+                            x_host=TRUSTED_PROXIES)
+
+socketio = SocketIO(app, cors_allowed_origins="*", max_http_buffer_size=ratelimit.MAX_HTTP_BUFFER)
+tracing.wrap_handlers(socketio)   # before the first @socketio.on below
+
+STARTUP_REPORT = []   # [(phase, ms)] filled by create_app()
+_created = False
+
+
+# === Application factory ===
+# Importing this module only builds the app object and its routes; anything
+# that touches the DB or pulls in game modules happens in create_app().
+# Schema creation is a separate step: `python app.py migrate`.
+
+def create_app(async_db=False, sync_mods=True):
+    """Finish wiring the app (DB, game blueprints, mod flags). Safe to call twice.
+    async_db: reach the DB through its asyncio driver (asgi.py runs every caller in a greenlet).
+    sync_mods=False leaves the mod flags alone; migrate() sets them once the schema exists."""
+    global _created
+    if _created:
+        return app
+    t = time.perf_counter()
+    STARTUP_REPORT.append(('import', (t - _T0) * 1000))
+
+    def mark(phase):
+        nonlocal t
+        now = time.perf_counter()
+        STARTUP_REPORT.append((phase, (now - t) * 1000))
+        t = now
+
+    # ✅ Railway sets this automatically
+    DATABASE_URL = os.environ.get("DATABASE_URL")
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set. Please check your Railway environment variables.")
+    REPLICA_URLS = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(',') if u.strip()]
+    if async_db:
+        from asgi import async_url
+        DATABASE_URL = async_url(DATABASE_URL)
+        REPLICA_URLS = [async_url(u) for u in REPLICA_URLS]
+    app.config['DB_ASYNC'] = async_db   # engines from create_async_engine: see models._SQLAlchemy
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+    replicas.configure(app, REPLICA_URLS)
+    db.init_app(app)
+    mark('db')
+
+    import assets
+    assets.init_app(app)
+    mark('assets')
+
+    # --- Xeri game (new, minimal; does not affect Stress) ---
+    from games.xeri.blueprint import xeri_bp
+    app.register_blueprint(xeri_bp, url_prefix="/game/xeri")
+    mark('xeri')
+
+    # === Initialize Games module ===
+    from games_service import init_socketio as init_games, TABLE_EVICTED
+    init_games(socketio, app)
+    TABLE_EVICTED.append(lambda game_id, table_id: history.forget(f"table:{table_id}"))
+    mark('games')
+
+    def sync_in_context():
+        with app.app_context():
+            sync_moderators()
+    if sync_mods and async_db:   # the DB is only reachable from the event loop, which asgi.py starts later
+        socketio.start_background_task(sync_in_context)
+    elif sync_mods:
+        sync_in_context()
+    mark('moderators')
+
+    tracing.init_app(app, socketio)
+    mark('tracing')
+
+    registry.backend = make_backend()
+    socketio.start_background_task(idle.run, socketio.sleep)
+    socketio.start_background_task(registry.run, socketio.sleep)
+    if replicas.NAMES:
+        socketio.start_background_task(replicas.monitor, app, socketio.sleep)
+
+    _created = True
+    total = sum(ms for _, ms in STARTUP_REPORT)
+    print("[STARTUP] " + " | ".join(f"{p} {ms:.1f}ms" for p, ms in STARTUP_REPORT) + f" | total {total:.1f}ms")
+    return app
+
+
+def sync_moderators():
+    """Set the mod flag for everyone in moderators.py with one UPDATE."""
+    try:
+        updated = (
+            User.query
+            .filter(User.username.in_(moderators), User.mod.isnot(True))
+            .update({User.mod: True}, synchronize_session=False)
+        )
+        db.session.commit()
+        return updated
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"[STARTUP] Moderator sync skipped ({e.__class__.__name__}); run `python app.py migrate`.")
+        return 0
+
+
+def migrate():
+    """Explicit schema step, run once per deploy instead of on every import."""
+    create_app(sync_mods=False)
+    with app.app_context():
+        db.create_all()
+        add_missing_columns()
+        backfill_rendered()
+        updated = sync_moderators()
+    print(f"[MIGRATE] Schema up to date; {updated} moderator flag(s) set.")
+
+
+def add_missing_columns():
+    """create_all() only creates missing tables; add new columns and indexes to existing ones."""
+    insp = sa_inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        have = {c['name'] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in have:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(db.engine.dialect)}"
+            if col.server_default is not None:
+                ddl += f" DEFAULT '{col.server_default.arg}'"
+            if not col.nullable:
+                ddl += " NOT NULL"
+            with db.engine.begin() as conn:
+                conn.execute(text(ddl))
+            print(f"[MIGRATE] Added {table.name}.{col.name}")
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def backfill_rendered(batch=500):
+    """Render messages written before Message.rendered existed, a batch at a time."""
+    done = 0
+    while True:
+        rows = Message.query.filter(Message.rendered.is_(None)).order_by(Message.id).limit(batch).all()
+        if not rows:
+            break
+        for m in rows:
+            m.rendered = render(m.text)
+        db.session.commit()
+        done += len(rows)
+    if done:
+        print(f"[MIGRATE] Rendered {done} older message(s).")
 
-socketio = SocketIO(app, cors_allowed_origins="*")
-db.init_app(app)
-
-
-# --- Xeri game (new, minimal; does not affect Stress) ---
-from games.xeri.blueprint import xeri_bp
-app.register_blueprint(xeri_bp, url_prefix="/game/xeri")
 
+@app.cli.command('migrate')
+def migrate_command():
+    migrate()
 
-# === Initialize DB and assign mod flags ===
-with app.app_context():
-    db.create_all()
-    for mod_name in moderators:
-        mod_user = User.query.filter_by(username=mod_name).first()
-        if mod_user and not mod_user.mod:
-            mod_user.mod = True
-    db.session.commit()
 
-# === Initialize Games module ===
-init_games(socketio, app)
+@app.cli.command('export')
+@click.option('--since', help="ISO date/time, inclusive")
+@click.option('--until', help="ISO date/time, exclusive")
+@click.option('--user', help="only this username")
+@click.option('--room', help="only this room (global, game:<name>, table:<id>)")
+@click.option('--gzip', 'gz', is_flag=True, help="gzip the output")
+@click.option('-o', '--output', type=click.File('wb'), default='-', help="file to write (default stdout)")
+def export_command(since, until, user, room, gz, output):
+    """Write chat history as NDJSON."""
+    create_app()
+    stmt = export.query(export.parse_time(since), export.parse_time(until), user, room)
+    body = export.buffered(export.ndjson(stmt))
+    for chunk in export.gzip(body) if gz else body:
+        output.write(chunk)
 
 
 # === Global State ===
-online_users = set()
-sessions = {}
+# Logged-in users are leases in the presence registry (see presence.py); the
+# backend is chosen in create_app() from PRESENCE_BACKEND.
+registry = PresenceRegistry(MemoryBackend(), on_expire=lambda user: on_lease_expired(user))
 muted_users = set()
-last_activity = {}
+history = RoomHistory()
+SID_CHANNELS = {}   # { sid: joined game/table channel }
+MESSAGES_REMOVED = Version()   # older history pages only change when messages are deleted
+idle = IdleDetector(AFK_AFTER, on_change=lambda user, afk: emit_presence(user, afk))
 
 @app.route('/')
 def index():
@@ -67,7 +231,11 @@ def register():
         if User.query.filter_by(username=username).first():
             return "Username already exists"
 
-        hashed_pw = generate_password_hash(password)
+        try:
+            auth_pool.admit(request.remote_addr, None)
+            hashed_pw = auth_pool.hash_password(password, sleep=socketio.sleep)
+        except auth_pool.AuthBusy as e:
+            return str(e), 429
         is_mod = username in moderators
         new_user = User(username=username, password=hashed_pw, mod=is_mod)
         db.session.add(new_user)
@@ -82,15 +250,23 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
-        user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
-            if username in sessions:
+        try:
+            auth_pool.admit(request.remote_addr, username)
+            user = User.query.filter_by(username=username).first()
+            ok = bool(user) and auth_pool.verify_password(user.password, password, sleep=socketio.sleep)
+        except auth_pool.AuthBusy as e:
+            return str(e), 429
+
+        if ok:
+            auth_pool.succeeded(request.remote_addr, username)
+            lease = session.get('lease') or secrets.token_urlsafe(16)
+            if not registry.claim(username, lease):
                 return "User is already logged in elsewhere"
 
             user.mod = username in moderators
             db.session.commit()
             session['username'] = username
-            sessions[username] = True
+            session['lease'] = lease
             return redirect(url_for('chat'))
         return "Invalid username or password"
 
@@ -100,11 +276,11 @@ def login():
 def logout():
     username = session.get('username')
     if username:
-        online_users.discard(username)
-        sessions.pop(username, None)
-        last_activity.pop(username, None)
+        registry.release(username, session.get('lease'))
+        idle.remove(username)
         emit_update_users()
     session.pop('username', None)
+    session.pop('lease', None)
     return redirect(url_for('index'))
 
 @app.route('/chat')
@@ -112,24 +288,24 @@ def chat():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    user = User.query.filter_by(username=session['username']).first()
-    messages = Message.query.order_by(Message.timestamp.desc()).limit(50).all()[::-1]
-
-
+    boot = bootstrap_state(session['username'], GLOBAL)
     return render_template(
         'chat.html',
         username=session['username'],
-        messages=messages,
-        is_mod=user.mod if user else False,
-        muted=list(muted_users),
-        data_username=session['username']
+        messages=boot['messages'],
+        is_mod=boot['user']['is_mod'],
+        muted=boot['muted'],
+        data_username=session['username'],
+        bootstrap=boot
     )
 
 @app.route('/game')
 def game():
     if 'username' not in session:
         return redirect(url_for('login'))
-    return render_template('game.html', username=session['username'])
+    boot = bootstrap_state(session['username'], GLOBAL)
+    return render_template('game.html', username=session['username'], messages=boot['messages'],
+                           is_mod=boot['user']['is_mod'], muted=boot['muted'], bootstrap=boot)
 
 
 @app.route('/games')
@@ -144,7 +320,39 @@ def games():
 def game_room(room_name):
     if 'username' not in session:
         return redirect(url_for('login'))
-    return render_template('game.html', username=session['username'], room=room_name)
+    channel = channel_for(room_name)
+    if channel is None:
+        return "Invalid room name", 400
+    if not known_channel(channel):
+        return "No such room", 404
+    boot = bootstrap_state(session['username'], channel)
+    return render_template('game.html', username=session['username'], room=room_name,
+                           messages=boot['messages'], is_mod=boot['user']['is_mod'],
+                           muted=boot['muted'], bootstrap=boot)
+
+@app.route('/api/bootstrap')
+def bootstrap():
+    """Everything a chat/game page needs on load, in one response."""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    channel = channel_for(request.args.get('room'))
+    if channel is None:
+        return jsonify({'error': 'Invalid room'}), 400
+    if not known_channel(channel):
+        return jsonify({'error': 'No such room'}), 404
+    return jsonify(bootstrap_state(session['username'], channel, request.args.get('game', 'xeri')))
+
+def bootstrap_state(username, channel, game_id='xeri'):
+    """Profile, recent messages, presence and lobby tables, all from in-memory state."""
+    from games_service import lobby_snapshot
+    return {
+        'user': {'username': username, 'is_mod': username in moderators},
+        'room': channel,
+        'messages': history.recent(channel, load_history)[-50:],
+        'presence': [{'name': u, 'afk': idle.is_afk(u)} for u in registry.online()],
+        'muted': list(muted_users),
+        'lobby': lobby_snapshot(game_id),
+    }
 
 @app.route('/game/<room_name>/tables')
 def game_tables(room_name):
@@ -162,46 +370,89 @@ def game_tables(room_name):
 @socketio.on('connect')
 def handle_connect():
     username = session.get('username')
+    join_room(GLOBAL)
     if username:
-        online_users.add(username)
-        last_activity[username] = datetime.utcnow()
+        if not renew_lease(username):
+            return False   # another login holds this user's lease
+        idle.touch(username)
         join_room(username)
         emit('message', f"{username} joined the chat", broadcast=True)
         emit_update_users()
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    ratelimit.forget(request.sid)
+    SID_CHANNELS.pop(request.sid, None)
     username = session.get('username')
     if username:
-        online_users.discard(username)
-        sessions.pop(username, None)
-        last_activity.pop(username, None)
+        registry.release(username, session.get('lease'))
+        idle.remove(username)
         leave_room(username)
         emit_update_users()
 
+@socketio.on('heartbeat')
+@limited('heartbeat')
+def handle_heartbeat():
+    username = session.get('username')
+    if username and not renew_lease(username):
+        disconnect()
+
 @socketio.on('chat')
+@limited('chat')
 def handle_chat(msg):
     username = session.get('username', 'Anonymous')
     if username in muted_users:
         return
-    last_activity[username] = datetime.utcnow()
-    message = Message(username=username, text=msg)
+    if registry.is_online(username):
+        idle.touch(username)
+    message = Message(username=username, text=msg, rendered=render(msg), room=GLOBAL)
     db.session.add(message)
     db.session.commit()
-    timestamp = message.timestamp.strftime('%H:%M')
     user = User.query.filter_by(username=username).first()
 
-    emit('chat', {
-    'id': message.id,
-    'username': username,
-    'text': msg,
-    'timestamp': timestamp,
-    'full_timestamp': message.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-    'mod': user.mod if user else False
-}, broadcast=True)
+    payload = message_payload(message)
+    payload['mod'] = user.mod if user else False
+    history.append(GLOBAL, payload)
+    emit('chat', payload, to=GLOBAL, skip_sid=ratelimit.slow_sids(socketio.server))
+
+
+@socketio.on('join_room')
+@limited('join_room')
+def handle_join_room(data):
+    """Switch this connection's game/table channel and send that channel's recent history."""
+    channel = channel_for((data or {}).get('room'))
+    if not channel or channel == GLOBAL or not known_channel(channel):
+        return
+    old = SID_CHANNELS.get(request.sid)
+    if old and old != channel:
+        leave_room(old)
+    leave_room(GLOBAL)   # a room page shows its own channel, not the main chat
+    SID_CHANNELS[request.sid] = channel
+    join_room(channel)
+    emit('chat_history', {'room': channel, 'messages': history.recent(channel, load_history)})
+
+
+@socketio.on('chat_message')
+@limited('chat_message')
+def handle_chat_message(data):
+    username = session.get('username')
+    channel = SID_CHANNELS.get(request.sid)
+    text_ = (data or {}).get('message')
+    if not username or username in muted_users or not text_:
+        return
+    if channel_for(data.get('room')) != channel:
+        return   # only the channel this connection joined
+    idle.touch(username)
+    message = Message(username=username, text=text_, rendered=render(text_), room=channel)
+    db.session.add(message)
+    db.session.commit()
+    payload = message_payload(message)
+    history.append(channel, payload)
+    emit('chat_message', payload, to=channel, skip_sid=ratelimit.slow_sids(socketio.server))
 
 
 @socketio.on('delete_message')
+@limited('delete_message')
 def delete_message(message_id):
     username = session.get('username')
     user = User.query.filter_by(username=username).first()
@@ -217,12 +468,113 @@ def delete_message(message_id):
         print(f"[DELETE] {username} deleted message ID {message_id}")
         db.session.delete(message)
         db.session.commit()
-        emit('remove_message', message_id, broadcast=True)
+        history.discard([message_id])
+        MESSAGES_REMOVED.bump()
+        emit('remove_message', message_id, broadcast=True,
+             skip_sid=ratelimit.slow_sids(socketio.server))
     else:
         print(f"[DELETE] Message ID {message_id} not found.")
 
 
+# --- Bulk moderation ---------------------------------------------------------
+# Each runs as one DELETE ... RETURNING id, then drops the ids from the ring
+# buffers, invalidates /load_more pages and sends one remove_messages event.
+# Handlers return {'deleted': n} (or {'error': ...}) as the Socket.IO ack.
+
+def mod_user():
+    username = session.get('username')
+    user = User.query.filter_by(username=username).first()
+    return user if user and user.mod else None
+
+
+def remove_messages(*where, announce_all=True):
+    """Delete every message matching `where` in one statement; the deleted ids.
+    announce_all=False tells clients only about the ids still in the history buffers -
+    for bulk cleanups of old messages, which no live page is showing."""
+    ids = db.session.execute(delete(Message).where(*where).returning(Message.id)).scalars().all()
+    db.session.commit()
+    if ids:
+        buffered = history.discard(ids)
+        MESSAGES_REMOVED.bump()
+        announce = ids if announce_all else buffered
+        if announce:
+            socketio.emit('remove_messages', announce, skip_sid=ratelimit.slow_sids(socketio.server))
+    return ids
+
+
+@socketio.on('delete_messages')
+@limited('delete_messages')
+def delete_messages(data):
+    """{'ids': [...]}"""
+    user = mod_user()
+    if not user:
+        return {'error': 'Access denied'}
+    ids = (data or {}).get('ids')
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return {'error': 'ids must be a list of message ids'}
+    removed = remove_messages(Message.id.in_(ids)) if ids else []
+    print(f"[DELETE] {user.username} deleted {len(removed)} of {len(ids)} message(s) by id")
+    return {'deleted': len(removed)}
+
+
+@socketio.on('delete_user_messages')
+@limited('delete_user_messages')
+def delete_user_messages(data):
+    """{'username', 'since'?, 'until'?, 'room'?} - since/until are ISO dates, until exclusive."""
+    user = mod_user()
+    if not user:
+        return {'error': 'Access denied'}
+    data = data or {}
+    target = data.get('username')
+    if not target or not isinstance(target, str):
+        return {'error': 'username required'}
+    try:
+        since = export.parse_time(data.get('since'))
+        until = export.parse_time(data.get('until'))
+    except (TypeError, ValueError):
+        return {'error': 'since/until must be ISO-8601 dates'}
+    where = [Message.username == target]
+    if since:
+        where.append(Message.timestamp >= since)
+    if until:
+        where.append(Message.timestamp < until)
+    if data.get('room'):
+        channel = channel_for(data['room'])
+        if not channel:
+            return {'error': 'Invalid room'}
+        where.append(Message.room == channel)
+    removed = remove_messages(*where)
+    print(f"[DELETE] {user.username} deleted {len(removed)} message(s) by {target}")
+    return {'deleted': len(removed)}
+
+
+@socketio.on('purge_images')
+@limited('purge_images')
+def purge_images(data=None):
+    """{'room'?, 'before'?} - every image message, optionally in one room / before a date."""
+    user = mod_user()
+    if not user:
+        return {'error': 'Access denied'}
+    data = data or {}
+    where = [Message.rendered.startswith(IMAGE_TAG, autoescape=True)]
+    try:
+        before = export.parse_time(data.get('before'))
+    except (TypeError, ValueError):
+        return {'error': 'before must be an ISO-8601 date'}
+    if before:
+        where.append(Message.timestamp < before)
+    if data.get('room'):
+        channel = channel_for(data['room'])
+        if not channel:
+            return {'error': 'Invalid room'}
+        where.append(Message.room == channel)
+    removed = remove_messages(*where)
+    print(f"[DELETE] {user.username} purged {len(removed)} image(s)")
+    return {'deleted': len(removed)}
+
+
 @socketio.on('mute_user')
+@limited('mute_user')
 def mute_user(username_to_mute):
     username = session.get('username')
     user = User.query.filter_by(username=username).first()
@@ -232,6 +584,7 @@ def mute_user(username_to_mute):
         emit_update_users()
 
 @socketio.on('unmute_user')
+@limited('unmute_user')
 def unmute_user(username_to_unmute):
     username = session.get('username')
     user = User.query.filter_by(username=username).first()
@@ -241,17 +594,21 @@ def unmute_user(username_to_unmute):
         emit_update_users()
 
 @socketio.on('typing')
+@limited('typing')
 def handle_typing():
     username = session.get('username')
     if username:
-        last_activity[username] = datetime.utcnow()
-        emit('typing', username, broadcast=True, include_self=False)
+        idle.touch(username)
+        emit('typing', username, broadcast=True,
+             skip_sid=ratelimit.slow_sids(socketio.server, also=request.sid))
 
 @socketio.on('stop_typing')
+@limited('stop_typing')
 def handle_stop_typing():
     username = session.get('username')
     if username:
-        emit('stop_typing', username, broadcast=True, include_self=False)
+        emit('stop_typing', username, broadcast=True,
+             skip_sid=ratelimit.slow_sids(socketio.server, also=request.sid))
 
 
 
@@ -259,17 +616,101 @@ def handle_stop_typing():
 
 # === Utility ===
 
+def known_channel(channel):
+    """Rooms that may have history: see chat_rooms.known()."""
+    from games_service import GAMES_META, TABLES
+    return known(channel, GAMES_META, lambda table_id: any(table_id in tables for tables in TABLES.values()))
+
+def load_history(room, limit):
+    """Newest `limit` messages of a room, oldest first (served by ix_message_room_id)."""
+    rows = Message.query.filter(Message.room == room).order_by(Message.id.desc()).limit(limit).all()
+    return rows[::-1]
+
+def renew_lease(username):
+    """Heartbeat this session's lease, re-claiming it if it lapsed or was released by another tab."""
+    lease = session.setdefault('lease', secrets.token_urlsafe(16))
+    return registry.heartbeat(username, lease) or registry.claim(username, lease)
+
+def on_lease_expired(user):
+    idle.remove(user)
+    emit_update_users()
+
 def emit_update_users():
-    now = datetime.utcnow()
-    user_data = []
-    for user in online_users:
-        afk = (now - last_activity.get(user, now)) > timedelta(minutes=5)
-        user_data.append({'name': user, 'afk': afk})
+    online_users = registry.online()
+    user_data = [{'name': user, 'afk': idle.is_afk(user)} for user in online_users]
 
     for user in online_users:
         is_mod = user in moderators
         socketio.emit('update_users', (user_data, is_mod, list(muted_users)), room=user)
 
+def emit_presence(user, afk):
+    """Push a single afk/active transition instead of the whole user list."""
+    if registry.is_online(user):
+        socketio.emit('user_status', {'name': user, 'afk': afk},
+                      skip_sid=ratelimit.slow_sids(socketio.server))
+
+@app.route('/admin/ratelimit')
+def ratelimit_stats():
+    if session.get('username') not in moderators:
+        return "Access denied", 403
+    return jsonify(dict(ratelimit.stats))
+
+@app.route('/admin/memory')
+def memory_stats():
+    """Approximate bytes held by in-memory state, so leaks show up before the OOM killer does."""
+    if session.get('username') not in moderators:
+        return "Access denied", 403
+    import games_service, memstats, xeri_analysis, xeri_solver
+    size = memstats.Sizer(sleep=socketio.sleep)
+    report = games_service.memory_report(size)
+    report['presence'] = {'count': len(registry.online()),
+                          'bytes': size((registry, idle, muted_users, SID_CHANNELS))}
+    rooms = socketio.server.manager.rooms
+    report['socket_rooms'] = {'count': sum(len(r) for r in rooms.values()), 'bytes': size(rooms)}
+    report['chat_history'] = {'count': len(history.buffers), 'bytes': size(history.buffers)}
+    report['ratelimit'] = {'bytes': size((ratelimit._sid_buckets, ratelimit._user_buckets))}
+    report['solver_cache'] = {'count': len(xeri_solver._tt), 'bytes': size(xeri_solver._tt)}
+    report['hint_cache'] = {'count': len(xeri_analysis._cache), 'bytes': size(xeri_analysis._cache)}
+    report['total_bytes'] = sum(v['bytes'] for v in report.values())
+    return jsonify(report)
+
+@app.route('/admin/replicas')
+def replica_status():
+    if session.get('username') not in moderators:
+        return "Access denied", 403
+    return jsonify(replicas.status())
+
+@app.route('/admin/traces')
+def recent_traces():
+    """Traces kept by the in-memory collector (TRACING=memory), newest first, as OTLP/JSON."""
+    if session.get('username') not in moderators:
+        return "Access denied", 403
+    n = min(request.args.get('n', 20, type=int), tracing.KEEP)
+    return jsonify({'stats': tracing.stats, 'traces': list(reversed(tracing.collected))[:n]})
+
+@app.route('/admin/export')
+def export_messages():
+    """Stream matching messages as NDJSON: ?since=&until= (ISO dates), &user=, &room=, &gzip=1."""
+    if session.get('username') not in moderators:
+        return "Access denied", 403
+    try:
+        since = export.parse_time(request.args.get('since'))
+        until = export.parse_time(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'since/until must be ISO-8601 dates'}), 400
+    room = request.args.get('room')
+    if room and channel_for(room) is None:
+        return jsonify({'error': 'Invalid room'}), 400
+    stmt = export.query(since, until, request.args.get('user'), room and channel_for(room))
+    body = export.buffered(export.ndjson(stmt))
+    name = 'messages.ndjson'
+    mimetype = 'application/x-ndjson'
+    if request.args.get('gzip'):
+        body, name, mimetype = export.gzip(body), name + '.gz', 'application/gzip'
+    print(f"[EXPORT] {session['username']} exporting {request.query_string.decode() or 'everything'}")
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{name}"'})
+
 @app.route('/admin/cleanup')
 def manual_cleanup():
     username = session.get('username')
@@ -284,41 +725,44 @@ def manual_cleanup():
 @app.route('/load_more', methods=['GET'])
 def load_more():
     before_id = request.args.get('before_id', type=int)
-    if not before_id:
+    room = channel_for(request.args.get('room'))
+    if not before_id or not room:
         return jsonify([])
 
-    messages = (
-        Message.query
-        .filter(Message.id < before_id)
-        .order_by(Message.timestamp.desc())
-        .limit(50)
-        .all()
-    )
-
-    messages = list(reversed(messages))  # oldest to newest
+    def build():
+        messages = (
+            Message.query
+            .filter(Message.room == room, Message.id < before_id)
+            .order_by(Message.id.desc())
+            .limit(50)
+            .all()
+        )
 
-    return jsonify([
-        {
-            'id': msg.id,
-            'username': msg.username,
-            'text': msg.text,
-            'timestamp': msg.timestamp.strftime('%H:%M')
-        }
-        for msg in messages
-    ])
+        messages = list(reversed(messages))  # oldest to newest
 
+        return jsonify([message_payload(msg) for msg in messages])
 
+    # a page below before_id never gains messages, so only deletions invalidate it
+    return conditional(MESSAGES_REMOVED.etag('lm', room, before_id), MESSAGES_REMOVED.at, build)
 
-# === Start Server ===
-
-if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 5000))
-    socketio.run(app, host='0.0.0.0', port=port)
 
 
 def delete_old_messages(days=30):
     threshold = datetime.utcnow() - timedelta(days=days)
-    deleted = Message.query.filter(Message.timestamp < threshold).delete()
-    db.session.commit()
-    print(f"[CLEANUP] Deleted {deleted} messages older than {days} days.")
+    deleted = remove_messages(Message.timestamp < threshold, announce_all=False)   # also drops them from buffers and cached pages
+    print(f"[CLEANUP] Deleted {len(deleted)} messages older than {days} days.")
+
+
+# === Start Server ===
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['migrate']:
+        migrate()
+    elif os.environ.get("SERVER_MODE") == "asgi":
+        import asgi   # builds its own copy of this module, running on asyncio
+        asgi.run(port=int(os.environ.get("PORT", 5000)))
+    else:
+        create_app()
+        port = int(os.environ.get("PORT", 5000))
+        socketio.run(app, host='0.0.0.0', port=port)
 
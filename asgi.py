@@ -0,0 +1,207 @@
+# asgi.py
+# asyncio deployment mode: python-socketio's AsyncServer and the Flask app
+# behind one ASGI callable, with the database reached through its asyncio
+# driver (aiosqlite / asyncpg).
+#
+#   SERVER_MODE=asgi python app.py        or        uvicorn asgi:application
+#
+# The handlers in app.py and games_service.py are the same ones the eventlet
+# server runs. SyncServer takes the place of Flask-SocketIO's socketio.server,
+# so emit(), join_room(), socketio.sleep() and friends keep their blocking
+# signatures, and every handler, HTTP request and background loop runs in a
+# greenlet on the event loop (SQLAlchemy's greenlet_spawn). Where the code
+# would block - a query, an emit, a sleep - the greenlet awaits the matching
+# coroutine instead, so other clients keep being served. That is the same
+# cooperative model eventlet gave these handlers, minus the monkey-patching;
+# blocking calls that are not routed through socketio or the DB (plain
+# time.sleep, requests) still stall the loop, as they would under eventlet.
+import asyncio, inspect, io, sys, time
+
+import socketio as sio
+from sqlalchemy.util.concurrency import await_only, greenlet_spawn, in_greenlet
+
+import app as chat
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+
+def async_url(url):
+    """The same database through its asyncio driver."""
+    scheme, sep, rest = url.partition('://')
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def _spawning(handler):
+    """A sync handler as a coroutine that runs it in a greenlet."""
+    async def run(*args):
+        return await greenlet_spawn(handler, *args)
+    return run
+
+
+class SyncServer:
+    """socketio.server for Flask-SocketIO, backed by an AsyncServer.
+
+    Coroutine methods (emit, enter_room, close_room, ...) are awaited from the
+    calling greenlet; anything else is the AsyncServer's own attribute.
+    """
+
+    def __init__(self, aserver, flask_app):
+        self.aserver = aserver
+        self.flask_app = flask_app
+        self.loop = None
+        self._pending = []   # background tasks started before the loop was running
+
+    def __getattr__(self, name):
+        attr = getattr(self.aserver, name)
+        if inspect.iscoroutinefunction(attr):
+            return lambda *args, **kwargs: self.block(attr(*args, **kwargs))
+        return attr
+
+    def block(self, coro):
+        if in_greenlet():
+            return await_only(coro)
+        if self.loop is not None and self.loop.is_running():   # e.g. a worker thread
+            return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+        coro.close()
+        raise RuntimeError("socket.io call made outside the event loop")
+
+    def on(self, event, handler=None, namespace=None):
+        if handler is None:
+            return lambda h: self.on(event, h, namespace) or h
+        self.aserver.on(event, _spawning(handler), namespace=namespace)
+
+    def get_environ(self, sid, namespace=None):
+        environ = self.aserver.get_environ(sid, namespace=namespace)
+        if environ is not None and 'flask.app' not in environ:
+            # what Flask-SocketIO's WSGI middleware adds, plus what Flask needs from the ASGI scope
+            scope = environ.get('asgi.scope', {})
+            environ['flask.app'] = self.flask_app
+            environ['wsgi.url_scheme'] = 'https' if scope.get('scheme') in ('https', 'wss') else 'http'
+            if scope.get('client'):
+                environ['REMOTE_ADDR'] = scope['client'][0]
+        return environ
+
+    def sleep(self, seconds=0):
+        if in_greenlet():
+            await_only(asyncio.sleep(seconds))
+        else:
+            time.sleep(seconds)
+
+    def start_background_task(self, target, *args, **kwargs):
+        if self.loop is None:
+            self._pending.append((target, args, kwargs))
+            return None
+        return self.loop.create_task(greenlet_spawn(target, *args, **kwargs))
+
+    def started(self, loop):
+        self.loop = loop
+        for target, args, kwargs in self._pending:
+            self.start_background_task(target, *args, **kwargs)
+        self._pending = []
+
+
+class WSGIBridge:
+    """Serve a WSGI app over ASGI HTTP, running it in a greenlet on the loop."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        body = []
+        while True:
+            message = await receive()
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        await greenlet_spawn(self._run, self.environ(scope, b''.join(body)), send)
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1] or 80),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+                continue
+            key = 'HTTP_' + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _run(self, environ, send):
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        def start():
+            status, headers = response
+            await_only(send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                             'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]}))
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            started = False
+            for chunk in result:   # streamed responses are sent as they are produced
+                if not started:
+                    start(); started = True
+                if chunk:
+                    await_only(send({'type': 'http.response.body', 'body': chunk, 'more_body': True}))
+            if not started:
+                start()
+            await_only(send({'type': 'http.response.body', 'body': b'', 'more_body': False}))
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+def build():
+    """Swap chat.socketio onto an AsyncServer, finish the app, and return the ASGI callable."""
+    fs = chat.socketio
+    aserver = sio.AsyncServer(async_mode='asgi', cors_allowed_origins='*',
+                              max_http_buffer_size=chat.ratelimit.MAX_HTTP_BUFFER)
+    bridge = SyncServer(aserver, chat.app)
+    # handlers app.py registered at import time; create_app() adds the /games ones through the bridge
+    for namespace, handlers in fs.server.handlers.items():
+        for event, handler in handlers.items():
+            bridge.on(event, handler, namespace=namespace)
+    fs.server = bridge
+    chat.create_app(async_db=True)
+
+    async def startup():
+        bridge.started(asyncio.get_running_loop())
+
+    flask_wsgi = getattr(chat.app.wsgi_app, 'wsgi_app', chat.app.wsgi_app)   # under Flask-SocketIO's middleware
+    return sio.ASGIApp(aserver, other_asgi_app=WSGIBridge(flask_wsgi), on_startup=startup)
+
+
+application = build()
+
+
+def run(host='0.0.0.0', port=5000):
+    import uvicorn
+    uvicorn.run(application, host=host, port=port, lifespan='on', log_level='warning')
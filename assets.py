@@ -0,0 +1,61 @@
+# assets.py
+# Serve the fingerprinted files produced by build_assets.py.
+# Templates call asset_url('xeri/xeri.css'); with a manifest present that is
+# /assets/xeri/xeri.<hash>.css (cached forever, precompressed), otherwise it
+# falls back to the plain /static URL so development needs no build step.
+import json, mimetypes, os
+
+from flask import abort, request, send_file, url_for
+
+DIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dist')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+manifest = {}
+
+
+def load_manifest():
+    global manifest
+    try:
+        with open(os.path.join(DIST, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    return manifest
+
+
+def asset_url(name):
+    built = manifest.get(name)
+    if built:
+        return url_for('serve_asset', filename=built)
+    return url_for('static', filename=name)
+
+
+def has_asset(name):
+    return name in manifest
+
+
+def serve_asset(filename):
+    path = os.path.normpath(os.path.join(DIST, filename))
+    if not path.startswith(DIST + os.sep) or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if filename.endswith('.js'):
+        mimetype = 'text/javascript'
+    accepted = request.accept_encodings
+    encoding = None
+    for enc, ext in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[enc] and os.path.isfile(path + ext):
+            path, encoding = path + ext, enc
+            break
+    resp = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=31536000)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = IMMUTABLE
+    return resp
+
+
+def init_app(app):
+    load_manifest()
+    app.add_url_rule('/assets/<path:filename>', 'serve_asset', serve_asset)
+    app.jinja_env.globals.update(asset_url=asset_url, has_asset=has_asset)
@@ -0,0 +1,156 @@
+# auth_pool.py
+# Password hashing off the event loop: a small process pool with a bounded
+# number of in-flight jobs, plus per-IP, per-(IP, user) and looser per-user
+# attempt limits so a login burst is rejected fast instead of queueing behind
+# expensive hashes. Bad passwords from one address cannot lock an account for
+# everyone else; only a spread-out attack reaches the per-user cap.
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import os, threading, time
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+AUTH_WORKERS = int(os.environ.get("AUTH_WORKERS", os.cpu_count() or 1))
+AUTH_MAX_PENDING = int(os.environ.get("AUTH_MAX_PENDING", max(1, AUTH_WORKERS) * 4))   # AUTH_WORKERS=0 hashes inline
+AUTH_TIMEOUT = float(os.environ.get("AUTH_TIMEOUT", 10))
+
+# (attempts, window seconds)
+IP_LIMIT = (20, 60)
+PAIR_LIMIT = (5, 60)     # one address guessing at one account
+USER_LIMIT = (30, 60)    # one account, from anywhere
+
+
+class AuthBusy(Exception):
+    """Raised when an auth job is refused (queue full or attempt limit hit)."""
+
+
+# --- worker-side functions (must be module level so they pickle)
+def _hash(password):
+    return generate_password_hash(password)
+
+def _check(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+# --- sliding-window attempt counters
+class AttemptLimiter:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.hits = {}   # { key: deque[timestamps] }
+
+    def allow(self, key):
+        now = time.monotonic()
+        if len(self.hits) > 10000:
+            self.prune()
+        q = self.hits.setdefault(key, deque())
+        while q and now - q[0] > self.window:
+            q.popleft()
+        if len(q) >= self.limit:
+            return False
+        q.append(now)
+        return True
+
+    def reset(self, key):
+        self.hits.pop(key, None)
+
+    def prune(self):
+        now = time.monotonic()
+        for key in [k for k, q in self.hits.items() if not q or now - q[-1] > self.window]:
+            del self.hits[key]
+
+
+ip_limiter = AttemptLimiter(*IP_LIMIT)
+pair_limiter = AttemptLimiter(*PAIR_LIMIT)
+user_limiter = AttemptLimiter(*USER_LIMIT)
+
+_pool = None
+_pending = 0
+_lock = threading.Lock()
+stats = {'submitted': 0, 'rejected_busy': 0, 'rejected_ip': 0, 'rejected_pair': 0, 'rejected_user': 0,
+         'inline': 0, 'timed_out': 0}
+
+
+def _get_pool():
+    global _pool
+    if _pool is None and AUTH_WORKERS > 0:
+        try:
+            _pool = ProcessPoolExecutor(max_workers=AUTH_WORKERS)
+        except (OSError, NotImplementedError) as e:  # e.g. no /dev/shm in a sandbox
+            print(f"[AUTH] Process pool unavailable ({e}); hashing inline.")
+            _pool = False
+    return _pool
+
+
+def _release(_fut=None):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def _run(fn, *args, sleep=time.sleep):
+    """Run fn in the pool; `sleep` lets the caller yield to its event loop while waiting.
+    A pooled job holds its slot until it really finishes, even if the caller gave up on it."""
+    global _pending
+    with _lock:
+        if _pending >= AUTH_MAX_PENDING:
+            stats['rejected_busy'] += 1
+            raise AuthBusy("Too many login attempts in progress")
+        _pending += 1
+    try:
+        pool = _get_pool()
+        if pool:
+            fut = pool.submit(fn, *args)
+    except BaseException:
+        _release()
+        raise
+    if not pool:
+        stats['inline'] += 1
+        try:
+            return fn(*args)
+        finally:
+            _release()
+    stats['submitted'] += 1
+    fut.add_done_callback(_release)   # a running hash can't be cancelled; its slot frees when it ends
+    deadline = time.monotonic() + AUTH_TIMEOUT
+    delay = 0.001
+    while not fut.done():
+        if time.monotonic() > deadline:
+            fut.cancel()
+            stats['timed_out'] += 1
+            raise AuthBusy("Authentication timed out")
+        sleep(delay)
+        delay = min(delay * 2, 0.02)
+    return fut.result()
+
+
+def admit(ip, username):
+    """Cheap admission check, run before any hashing. Raises AuthBusy."""
+    if not ip_limiter.allow(ip):
+        stats['rejected_ip'] += 1
+        raise AuthBusy("Too many attempts from this address")
+    if username and not pair_limiter.allow((ip, username)):
+        stats['rejected_pair'] += 1
+        raise AuthBusy("Too many attempts for this user")
+    if username and not user_limiter.allow(username):
+        stats['rejected_user'] += 1
+        raise AuthBusy("Too many attempts for this user")
+
+
+def succeeded(ip, username):
+    """A correct password clears that address's count for the account."""
+    pair_limiter.reset((ip, username))
+
+
+def hash_password(password, sleep=time.sleep):
+    return _run(_hash, password, sleep=sleep)
+
+def verify_password(pwhash, password, sleep=time.sleep):
+    return _run(_check, pwhash, password, sleep=sleep)
+
+
+def shutdown():
+    global _pool
+    if _pool:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
@@ -0,0 +1,164 @@
+# bench_modes.py
+# The same chat + HTTP workload against the eventlet server (python app.py)
+# and the asyncio one (SERVER_MODE=asgi python app.py).
+#
+#   python bench_modes.py --clients 50 --messages 10 --http 8
+#
+# Each mode gets a fresh SQLite database and its own server process. Users
+# are created straight in the DB and given signed session cookies, so login
+# hashing and its rate limits stay out of the numbers. Every client connects
+# over websocket and sends --messages chat lines at --rate per second (the
+# 'chat' budget in ratelimit.py allows 1/s); everyone receives every line,
+# and latency is send -> the sender seeing its own broadcast. Meanwhile
+# --http loops fetch /api/bootstrap, which reads the DB on each call.
+# Needs aiohttp (python-socketio's asyncio client).
+import argparse, asyncio, os, socket, subprocess, sys, tempfile, time
+
+try:
+    import aiohttp
+    import socketio
+except ImportError:
+    raise SystemExit("bench_modes.py needs aiohttp: pip install aiohttp")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = {'eventlet': {}, 'asgi': {'SERVER_MODE': 'asgi'}}
+
+
+def pct(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare(db_path, users):
+    """Create the schema and users; returns { name: session cookie }."""
+    url = f"sqlite:///{db_path}"
+    subprocess.run([sys.executable, 'app.py', 'migrate'], cwd=HERE, env=dict(os.environ, DATABASE_URL=url),
+                   check=True, stdout=subprocess.DEVNULL)
+    from sqlalchemy import create_engine
+    from app import app
+    from models import User
+    with create_engine(url).begin() as conn:
+        conn.execute(User.__table__.insert(), [{'username': u, 'password': '-', 'mod': False} for u in users])
+    signer = app.session_interface.get_signing_serializer(app)
+    cookie = app.config.get('SESSION_COOKIE_NAME', 'session')
+    return {u: f"{cookie}={signer.dumps({'username': u})}" for u in users}
+
+
+def start_server(mode, port, db_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", PORT=str(port), **MODES[mode])
+    proc = subprocess.Popen([sys.executable, 'app.py'], cwd=HERE, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit(f"{mode} server did not start on port {port}")
+
+
+async def run_workload(url, cookies, messages, rate, http_loops):
+    names = list(cookies)
+    sent = {}            # text -> send time
+    latency = []
+    received = [0]
+    clients = []
+
+    def on_chat(name):
+        def handler(data):
+            received[0] += 1
+            if data.get('username') == name:
+                key = data['html']
+                if key in sent:
+                    latency.append(time.perf_counter() - sent.pop(key))
+        return handler
+
+    t0 = time.perf_counter()
+    for name in names:
+        c = socketio.AsyncClient()
+        c.on('chat', on_chat(name))
+        await c.connect(url, headers={'Cookie': cookies[name]}, transports=['websocket'])
+        clients.append(c)
+    connect_s = time.perf_counter() - t0
+
+    http_latency = []
+    stop = asyncio.Event()
+
+    async def http_loop(i):
+        async with aiohttp.ClientSession(headers={'Cookie': cookies[names[i % len(names)]]}) as s:
+            while not stop.is_set():
+                t = time.perf_counter()
+                async with s.get(url + '/api/bootstrap?room=global') as r:
+                    await r.read()
+                http_latency.append(time.perf_counter() - t)
+
+    async def talk(i, c):
+        await asyncio.sleep(i / len(clients) / rate)   # spread the first sends
+        for n in range(messages):
+            text = f"bench {i} {n}"
+            sent[text] = time.perf_counter()
+            await c.emit('chat', text)
+            await asyncio.sleep(1 / rate)
+
+    loops = [asyncio.create_task(http_loop(i)) for i in range(http_loops)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(talk(i, c) for i, c in enumerate(clients)))
+    deadline = time.perf_counter() + 10
+    while sent and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await asyncio.gather(*loops)
+    for c in clients:
+        await c.disconnect()
+    return {'connect_s': connect_s, 'elapsed': elapsed, 'latency': latency, 'lost': len(sent),
+            'received': received[0], 'http': http_latency}
+
+
+def report(mode, r, expected):
+    ms = [x * 1000 for x in r['latency']]
+    http = [x * 1000 for x in r['http']]
+    print(f"[BENCH] {mode:9s} connect {r['connect_s']:.2f}s | chat p50 {pct(ms, 50):.1f} p95 {pct(ms, 95):.1f} "
+          f"p99 {pct(ms, 99):.1f} max {max(ms, default=float('nan')):.1f} ms | delivered {r['received']}/{expected} "
+          f"({r['received'] / r['elapsed']:,.0f}/s), lost {r['lost']} | http {len(http) / r['elapsed']:,.0f} req/s "
+          f"p50 {pct(http, 50):.1f} p95 {pct(http, 95):.1f} ms")
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Compare the eventlet and asyncio servers on one workload.")
+    ap.add_argument('--modes', default='eventlet,asgi')
+    ap.add_argument('--clients', type=int, default=30)
+    ap.add_argument('--messages', type=int, default=10, help="chat lines per client")
+    ap.add_argument('--rate', type=float, default=0.9, help="chat lines per second per client")
+    ap.add_argument('--http', type=int, default=4, help="concurrent /api/bootstrap loops")
+    args = ap.parse_args(argv)
+    sys.path.insert(0, HERE)
+
+    users = [f"bench{i}" for i in range(args.clients)]
+    expected = args.clients * args.messages * args.clients
+    for mode in args.modes.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            cookies = prepare(db_path, users)
+            port = free_port()
+            proc = start_server(mode, port, db_path)
+            try:
+                r = asyncio.run(run_workload(f"http://127.0.0.1:{port}", cookies, args.messages, args.rate, args.http))
+            finally:
+                proc.terminate()
+                proc.wait()
+            report(mode, r, expected)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
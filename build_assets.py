@@ -0,0 +1,130 @@
+# build_assets.py
+# Fingerprint static assets for immutable caching.
+#
+#   python build_assets.py [--sprite]
+#
+# Copies every file in ASSETS to static/dist/<dir>/<name>.<hash><ext>,
+# rewrites relative ES-module imports to the fingerprinted names, writes
+# .gz (and .br when the `brotli` package is installed) next to each file,
+# and records the mapping in static/dist/manifest.json for assets.asset_url().
+# --sprite also renders all 52 cards plus the back into one SVG sprite using
+# card-svg.js (needs `node` on PATH).
+import gzip, hashlib, json, os, re, shutil, subprocess, sys
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(ROOT, 'static')
+DIST = os.path.join(STATIC, 'dist')
+MANIFEST = os.path.join(DIST, 'manifest.json')
+
+ASSETS = [
+    'style.css',
+    'games/games.module.js',
+    'xeri/xeri.css',
+    'xeri/xeri.module.js',
+    'playing-cards/css/cards.css',
+    'playing-cards/js/card-svg.js',
+    'playing-cards/js/cards-core.js',
+]
+SPRITE = 'playing-cards/cards.sprite.svg'
+
+_IMPORT = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*)(["'])(\.{1,2}/[^"']+)\2""")
+
+
+def _fingerprint(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(name, data):
+    path = os.path.join(DIST, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def _build(name, manifest, stack=()):
+    """Fingerprint `name` after its own relative imports, so their new names are baked in."""
+    if name in manifest:
+        return manifest[name]
+    if name in stack:
+        raise SystemExit(f"Import cycle: {' -> '.join(stack + (name,))}")
+    with open(os.path.join(STATIC, name), 'rb') as f:
+        data = f.read()
+
+    if name.endswith('.js'):
+        here = os.path.dirname(name)
+
+        def rewrite(m):
+            dep = os.path.normpath(os.path.join(here, m.group(3))).replace(os.sep, '/')
+            if dep not in ASSETS:
+                return m.group(0)
+            built = _build(dep, manifest, stack + (name,))
+            rel = os.path.relpath(built, here or '.').replace(os.sep, '/')
+            return f"{m.group(1)}{m.group(2)}{rel if rel.startswith('.') else './' + rel}{m.group(2)}"
+
+        data = _IMPORT.sub(rewrite, data.decode('utf-8')).encode('utf-8')
+
+    out = _fingerprint(name, data)
+    _write(out, data)
+    manifest[name] = out
+    return out
+
+
+_SPRITE_JS = """
+import { cardSVG } from %s;
+const ranks = ["A","2","3","4","5","6","7","8","9","10","J","Q","K"];
+const out = {};
+for (const s of ["S","H","D","C"]) for (const r of ranks) out[r + s] = cardSVG({rank: r, suit: s, faceUp: true});
+out.back = cardSVG({rank: "A", suit: "S", faceUp: false});
+process.stdout.write(JSON.stringify(out));
+"""
+
+
+def build_sprite(manifest):
+    """One <symbol id="card-AS"> ... per card, rendered by the same card-svg.js the browser uses."""
+    node = shutil.which('node')
+    if not node:
+        print("[ASSETS] node not found; skipping card sprite.")
+        return None
+    src = 'file://' + os.path.join(STATIC, 'playing-cards/js/card-svg.js')
+    res = subprocess.run([node, '--input-type=module', '-e', _SPRITE_JS % json.dumps(src)],
+                         capture_output=True, text=True, check=True)
+    symbols = []
+    for key, svg in json.loads(res.stdout).items():
+        inner = re.sub(r'^\s*<svg[^>]*>|</svg>\s*$', '', svg)
+        symbols.append(f'<symbol id="card-{key}" viewBox="0 0 190 258">{inner.strip()}</symbol>')
+    data = ('<svg xmlns="http://www.w3.org/2000/svg" style="display:none">'
+            + ''.join(symbols) + '</svg>').encode('utf-8')
+    out = _fingerprint(SPRITE, data)
+    _write(out, data)
+    manifest[SPRITE] = out
+    return out
+
+
+def main(argv):
+    if os.path.isdir(DIST):
+        shutil.rmtree(DIST)
+    os.makedirs(DIST)
+    manifest = {}
+    for name in ASSETS:
+        _build(name, manifest)
+    if '--sprite' in argv:
+        build_sprite(manifest)
+    with open(MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"[ASSETS] {len(manifest)} file(s) -> {os.path.relpath(DIST, ROOT)}"
+          f" (gzip{', brotli' if brotli else ''})")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,36 @@
+# chat_render.py
+# Turn raw chat text into safe HTML once, when the message is written.
+# Everything is escaped except two things we produce ourselves: links for
+# http(s) URLs and <img> tags for the data-URL images the upload button sends.
+import re
+
+from markupsafe import escape
+
+_IMG = re.compile(r"""^\s*<img\s+src=['"](data:image/(?:png|jpe?g|gif|webp);base64,[A-Za-z0-9+/=]+)['"][^>]*>\s*$""")
+_URL = re.compile(r"""https?://[^\s<>"']+""")
+_TRAILING = '.,;:!?)'
+IMAGE_TAG = '<img class="chat-img"'   # every rendered image starts with this
+
+
+def _link(url):
+    href = escape(url)
+    return f'<a href="{href}" target="_blank" rel="noopener nofollow ugc">{href}</a>'
+
+
+def render(text):
+    """Sanitized, linkified HTML for a chat message."""
+    m = _IMG.match(text)
+    if m:
+        return f'{IMAGE_TAG} src="{m.group(1)}" alt="image" style="max-width:200px;">'
+    out, pos = [], 0
+    for m in _URL.finditer(text):
+        url = m.group(0).rstrip(_TRAILING)
+        out.append(str(escape(text[pos:m.start()])))
+        out.append(_link(url))
+        pos = m.start() + len(url)
+    out.append(str(escape(text[pos:])))
+    return ''.join(out).replace('\n', '<br>')
+
+
+def is_image(text):
+    return bool(_IMG.match(text))
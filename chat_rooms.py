@@ -0,0 +1,96 @@
+# chat_rooms.py
+# Chat channels and their recent-history ring buffers.
+#   global          the main chat
+#   game:<name>     a /game/<room_name> page
+#   table:<id>      a games table
+# Buffers are filled from the DB on first use and then kept current by the
+# chat handlers, so joining a room or opening /chat does not hit the DB.
+# Only rooms that exist get one (callers check known() first), rooms with no
+# messages are not buffered, and at most MAX_ROOMS buffers are kept, least
+# recently read dropped first.
+from collections import OrderedDict, deque
+import os, re
+
+from chat_render import render
+
+GLOBAL = 'global'
+HISTORY_SIZE = 100
+MAX_ROOMS = int(os.environ.get("CHAT_HISTORY_ROOMS", 500))
+GAME_ROOMS = {r.strip() for r in os.environ.get("CHAT_GAME_ROOMS", "Game_1").split(',') if r.strip()}
+
+_NAME = re.compile(r'^[A-Za-z0-9_\-]{1,40}$')
+
+
+def channel_for(room):
+    """Normalize a client-supplied room name; None if it is not a valid channel."""
+    if not room or room == GLOBAL:
+        return GLOBAL
+    if not isinstance(room, str):
+        return None
+    kind, _, name = room.partition(':')
+    if name and kind in ('game', 'table'):
+        return room if _NAME.match(name) else None
+    return f"game:{room}" if _NAME.match(room) else None
+
+
+def message_payload(message):
+    """The dict clients receive for one Message row."""
+    return {
+        'id': message.id,
+        'username': message.username,
+        'html': message.rendered if message.rendered is not None else render(message.text),
+        'room': message.room,
+        'timestamp': message.timestamp.strftime('%H:%M'),
+        'full_timestamp': message.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def known(channel, game_ids=(), table_open=lambda table_id: False):
+    """True for channels that exist: the main chat, a game room in GAME_ROOMS or `game_ids`,
+    or a table for which `table_open(id)` holds."""
+    if channel == GLOBAL:
+        return True
+    kind, _, name = channel.partition(':')
+    if kind == 'game':
+        return name in GAME_ROOMS or name in game_ids
+    return kind == 'table' and table_open(name)
+
+
+class RoomHistory:
+    def __init__(self, size=HISTORY_SIZE, max_rooms=MAX_ROOMS):
+        self.size = size
+        self.max_rooms = max_rooms
+        self.buffers = OrderedDict()   # { room: deque[payload] }, oldest first; least recently read first
+
+    def recent(self, room, loader):
+        """Buffered history for `room`; `loader(room, limit)` fills it the first time."""
+        buf = self.buffers.get(room)
+        if buf is not None:
+            self.buffers.move_to_end(room)
+            return list(buf)
+        buf = deque((message_payload(m) for m in loader(room, self.size)), maxlen=self.size)
+        if buf:   # an empty room costs a query per read, not a buffer
+            self.buffers[room] = buf
+            while len(self.buffers) > self.max_rooms:
+                self.buffers.popitem(last=False)
+        return list(buf)
+
+    def append(self, room, payload):
+        buf = self.buffers.get(room)
+        if buf is not None:   # unloaded rooms pick it up from the DB later
+            buf.append(payload)
+
+    def forget(self, room):
+        self.buffers.pop(room, None)
+
+    def discard(self, ids):
+        """Drop `ids` from every buffer; the ones that were buffered."""
+        ids, dropped = set(ids), []
+        for buf in self.buffers.values():
+            if any(m['id'] in ids for m in buf):
+                kept = []
+                for m in buf:
+                    (dropped if m['id'] in ids else kept).append(m)
+                buf.clear()
+                buf.extend(kept)
+        return [m['id'] for m in dropped]
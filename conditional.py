@@ -0,0 +1,43 @@
+# conditional.py
+# Conditional GET from in-memory change counters. Handlers bump a Version
+# whenever the data behind an endpoint changes; the ETag is derived from the
+# counter, so a matching client gets a 304 before any JSON is built.
+from datetime import datetime, timezone
+import secrets, time
+
+from flask import request, make_response
+
+BOOT = secrets.token_hex(4)   # counters restart with the process; keep their ETags distinct
+
+
+class Version:
+    __slots__ = ('n', 'at')
+
+    def __init__(self):
+        self.n = 0
+        self.at = time.time()
+
+    def bump(self):
+        self.n += 1
+        self.at = time.time()
+
+    def etag(self, *parts):
+        return '-'.join([BOOT, str(self.n)] + [str(p) for p in parts])
+
+
+def conditional(etag, last_modified, build):
+    """304 if the request's validators match; otherwise build() and attach ETag/Last-Modified."""
+    lm = datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        ims = request.if_modified_since
+        fresh = ims is not None and lm <= ims
+    if fresh:
+        resp = make_response('', 304)
+    else:
+        resp = make_response(build())
+    resp.set_etag(etag, weak=True)
+    resp.last_modified = lm
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
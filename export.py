@@ -0,0 +1,78 @@
+# export.py
+# Chat history as NDJSON, one message per line, for moderator audits.
+# Rows are fetched with yield_per/stream_results (a server-side cursor on
+# PostgreSQL) as plain column tuples, so nothing accumulates in the session
+# and memory stays flat however many messages match. gzip() compresses the
+# same stream incrementally.
+from datetime import datetime, timezone
+import json, zlib
+
+from sqlalchemy import select
+
+from models import db, Message
+
+BATCH = 1_000
+COLUMNS = (Message.id, Message.username, Message.room, Message.text, Message.timestamp)
+
+
+def parse_time(value):
+    """ISO-8601 date or datetime -> naive UTC datetime (None passes through)."""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:   # Message.timestamp is stored naive, in UTC
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def query(since=None, until=None, username=None, room=None):
+    stmt = select(*COLUMNS).order_by(Message.id)
+    if since is not None:
+        stmt = stmt.where(Message.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(Message.timestamp < until)
+    if username:
+        stmt = stmt.where(Message.username == username)
+    if room:
+        stmt = stmt.where(Message.room == room)
+    return stmt
+
+
+def ndjson(stmt, batch=BATCH):
+    """Encoded lines, fetched `batch` rows at a time."""
+    result = db.session.execute(stmt.execution_options(yield_per=batch, stream_results=True))
+    try:
+        for mid, username, room, text, ts in result:
+            yield (json.dumps({'id': mid, 'username': username, 'room': room, 'text': text,
+                               'timestamp': ts.isoformat() if ts else None},
+                              ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+    finally:
+        result.close()
+
+
+def gzip(chunks, level=6, flush_every=64 * 1024):
+    """Gzip a byte stream as it goes, yielding roughly every `flush_every` input bytes."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)   # wbits 31: gzip container
+    pending = 0
+    for chunk in chunks:
+        out = z.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_every:
+            out += z.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if out:
+            yield out
+    yield z.flush()
+
+
+def buffered(lines, size=64 * 1024):
+    """Join small lines into ~`size` byte writes."""
+    buf, n = [], 0
+    for line in lines:
+        buf.append(line)
+        n += len(line)
+        if n >= size:
+            yield b''.join(buf)
+            buf, n = [], 0
+    if buf:
+        yield b''.join(buf)
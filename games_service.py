@@ -1,9 +1,20 @@
 # games_service.py
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, session
 from flask_socketio import SocketIO, join_room, emit
 from collections import deque
 from flask import request as flask_request  # avoid name clash
-import random, string
+import os, random, secrets, string, time
+
+import ratelimit
+from ratelimit import limited
+from matchmaking import MatchQueue
+from timers import DeadlineHeap, RateCounter
+from conditional import Version, conditional
+import ratings
+import xeri_rules
+from xeri_rules import last_deal
+import xeri_solver
+import xeri_analysis
 
 bp = Blueprint('games_api', __name__, url_prefix='/api')
 
@@ -13,8 +24,42 @@ GAMES_META = {
 }
 
 # --- in-memory state
+GAMES_VERSION = Version()   # GAMES_META is static; only restarts change it
+LOBBY_VERSIONS = {}         # { gameId: Version } bumped when a table listing changes
 TABLES = {}          # { gameId: { tableId: table_dict } }
 SID_TO_PLAYER = {}   # { sid: (gameId, tableId, playerId) }
+MATCH_QUEUES = {}    # { gameId: MatchQueue }
+SID_TO_QUEUE = {}    # { sid: (gameId, name, guest) }
+SID_TO_SPECTATOR = {}  # { sid: (gameId, tableId) }
+MAX_SPECTATORS = 200   # per table
+RESUME_TOKENS = {}   # { token: (gameId, tableId, playerId) }
+SEAT_GRACE = 30      # seconds a disconnected player's seat is held
+HELD_SEATS = DeadlineHeap()   # (gameId, tableId, playerId) -> release time
+CHANGE_LOG = 64      # state versions remembered per table for resume deltas
+SWEEP_EVERY = 1.0    # seconds
+TURN_SECONDS = float(os.environ.get("GAMES_TURN_SECONDS", 30))
+TURN_TIMERS = DeadlineHeap()  # (gameId, tableId) -> current turn deadline
+TURN_FIRES = RateCounter()
+# table_state coalescing: push_state() marks a table dirty and one flush, at most
+# STATE_FLUSH_MS later, sends whatever the table looks like by then
+STATE_FLUSH_MS = float(os.environ.get("GAMES_STATE_FLUSH_MS", 10))   # 0: next event-loop tick
+DIRTY = {}           # { (gameId, tableId): monotonic time first marked }
+STATE_STATS = {'marked': 0, 'sent': 0, 'flushes': 0, 'max_delay_ms': 0.0}
+# table lifecycle: collect_tables() runs from sweep_loop every TABLE_GC_EVERY seconds
+TABLE_EMPTY_TTL = float(os.environ.get("GAMES_TABLE_EMPTY_TTL", 120))    # no players or spectators
+TABLE_IDLE_TTL = float(os.environ.get("GAMES_TABLE_IDLE_TTL", 3600))     # no state change at all
+MAX_TABLES = int(os.environ.get("GAMES_MAX_TABLES", 1000))               # across all games
+TABLE_GC_EVERY = 30.0
+TABLE_EVICTED = []   # callbacks(game_id, table_id), e.g. to drop the table's chat buffer
+
+def lobby_version(game_id):
+    v = LOBBY_VERSIONS.get(game_id)
+    if v is None:
+        v = LOBBY_VERSIONS[game_id] = Version()
+    return v
+
+def lobby_changed(game_id):
+    lobby_version(game_id).bump()
 
 def _id(n=8):
     return ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(n))
@@ -22,67 +67,348 @@ def _id(n=8):
 # --- REST: games & tables
 @bp.get('/games')
 def list_games():
-    return jsonify(list(GAMES_META.values()))
+    return conditional(GAMES_VERSION.etag('games'), GAMES_VERSION.at, lambda: jsonify(list(GAMES_META.values())))
 
 @bp.get('/games/<game_id>')
 def game_info(game_id):
-    return jsonify(GAMES_META[game_id])
+    if game_id not in GAMES_META: return jsonify({'error': 'Unknown game'}), 404
+    return conditional(GAMES_VERSION.etag('game', game_id), GAMES_VERSION.at, lambda: jsonify(GAMES_META[game_id]))
 
 @bp.get('/games/<game_id>/tables')
 def list_tables(game_id):
-    out = []
-    for t in TABLES.get(game_id, {}).values():
-        out.append({'id': t['id'], 'name': t['name'], 'seats': t['seats'], 'players': len(t['players'])})
-    return jsonify(out)
+    if game_id not in GAMES_META: return jsonify({'error': 'Unknown game'}), 404   # before a counter is made
+    v = lobby_version(game_id)
+    return conditional(v.etag('tables', game_id), v.at, lambda: jsonify(table_summaries(game_id)))
+
+def table_summaries(game_id):
+    return [{'id': t['id'], 'name': t['name'], 'seats': t['seats'], 'players': len(t['players']),
+             'spectators': len(t['spectators'])} for t in TABLES.get(game_id, {}).values()]
+
+def lobby_snapshot(game_id=None):
+    """What games.module.js would fetch on mount, keyed by API path, for inlining into a page."""
+    out = {'/api/games': list(GAMES_META.values())}
+    if game_id in GAMES_META:
+        out[f'/api/games/{game_id}'] = GAMES_META[game_id]
+        out[f'/api/games/{game_id}/tables'] = table_summaries(game_id)
+    return out
 
 @bp.post('/games/<game_id>/tables')
 def create_table(game_id):
+    if game_id not in GAMES_META: return jsonify({'error': 'Unknown game'}), 404
     data = request.get_json(silent=True) or {}
-    name = data.get('name') or f"Table {len(TABLES.get(game_id, {})) + 1}"
+    t = new_table(game_id, data.get('name'))
+    if not t: return jsonify({'error': 'Too many tables'}), 503
+    return jsonify({'ok': True, 'id': t['id']})
+
+@bp.get('/timers')
+def timer_stats():
+    return jsonify({'active': len(TURN_TIMERS), 'turn_seconds': TURN_SECONDS,
+                    'fired_total': TURN_FIRES.total, 'fired_per_sec': round(TURN_FIRES.rate(), 3),
+                    'state_flush_ms': STATE_FLUSH_MS, 'state_pending': len(DIRTY), **STATE_STATS})
+
+@bp.get('/games/<game_id>/tables/<table_id>/analysis')
+def round_analysis(game_id, table_id):
+    """Move-by-move review of the table's last finished round."""
+    t = TABLES.get(game_id, {}).get(table_id)
+    if not t: return jsonify({'error': 'Unknown table'}), 404
+    if t['started']: return jsonify({'error': 'Round still in progress'}), 409
+    if not t['log']: return jsonify({'error': 'No finished round'}), 404
+    if 'analysis' not in t:
+        t['analysis'] = xeri_analysis.analyse(t['log'], sleep=socketio_ref.sleep if socketio_ref else None)
+    return jsonify(t['analysis'])
+
+# --- ratings & leaderboard
+@bp.get('/games/<game_id>/leaderboard')
+def leaderboard_top(game_id):
+    if game_id not in GAMES_META: return jsonify({'error': 'Unknown game'}), 404
+    n = min(request.args.get('n', 10, type=int), 100)
+    return jsonify(ratings.leaderboard(game_id).top(n))
+
+@bp.get('/games/<game_id>/leaderboard/me')
+def leaderboard_me(game_id):
+    if game_id not in GAMES_META: return jsonify({'error': 'Unknown game'}), 404
+    name = request.args.get('name') or session.get('username')
+    k = min(request.args.get('k', 5, type=int), 50)
+    lb = ratings.leaderboard(game_id)
+    rank, rows = lb.around(name, k)
+    return jsonify({'name': name, 'rank': rank, 'rating': round(lb.rating(name)), 'of': len(lb), 'around': rows})
+
+def new_table(game_id, name=None, seats=4):
+    """A fresh table, or None if MAX_TABLES are open and none of them is empty."""
+    if table_count() >= MAX_TABLES and not make_room():
+        print(f"[GAMES] Table cap ({MAX_TABLES}) reached; refusing a new {game_id} table")
+        return None
+    name = name or f"Table {len(TABLES.get(game_id, {})) + 1}"
     t = {
-        'id': _id(), 'name': name, 'seats': 4, 'players': [],
-        'started': False, 'turn_idx': 0, 'table': [], 'deck': deque()
+        'id': _id(), 'name': name, 'seats': seats, 'players': [], 'by_name': {}, 'spectators': set(),
+        'started': False, 'turn_idx': 0, 'table': [], 'deck': deque(),
+        'version': 0, 'changes': deque(maxlen=CHANGE_LOG), 'last_public': {},
+        'out': [], 'log': [], 'touched': time.monotonic(),
     }
     TABLES.setdefault(game_id, {})[t['id']] = t
-    return jsonify({'ok': True, 'id': t['id']})
+    lobby_changed(game_id)
+    return t
+
+def seat_player(game_id, t, name, sid, guest=False):
+    p = {'id': _id(), 'name': name, 'sid': sid, 'hand': [], 'ready': False, 'score': 0,
+         'token': secrets.token_urlsafe(16), 'guest': guest}
+    t['players'].append(p)
+    t['by_name'][name] = p
+    SID_TO_PLAYER[sid] = (game_id, t['id'], p['id'])
+    RESUME_TOKENS[p['token']] = (game_id, t['id'], p['id'])
+    lobby_changed(game_id)
+    socketio_ref.emit('seat', {'gameId': game_id, 'tableId': t['id'], 'playerId': p['id'], 'token': p['token']},
+                      room=sid, namespace=NS)
+    return p
+
+def rebind_seat(game_id, table_id, p, sid):
+    """Point a held (or stale) seat at connection `sid` and tell the table its player is back."""
+    info = (game_id, table_id, p['id'])
+    if p['sid'] and p['sid'] != sid:
+        SID_TO_PLAYER.pop(p['sid'], None)
+    HELD_SEATS.cancel(info)
+    p['sid'] = sid
+    SID_TO_PLAYER[sid] = info
+    socketio_ref.emit('player_status', {'id': p['id'], 'connected': True},
+                      room=room_key(game_id, table_id), skip_sid=sid, namespace=NS)
+
+def remove_player(game_id, t, pid):
+    for pl in t['players']:
+        if pl['id'] == pid:
+            RESUME_TOKENS.pop(pl.get('token'), None)
+    HELD_SEATS.cancel((game_id, t['id'], pid))
+    t['players'] = [pl for pl in t['players'] if pl['id'] != pid]
+    t['by_name'] = {pl['name']: pl for pl in t['players']}
+    if t['players']:
+        t['turn_idx'] %= len(t['players'])
+    lobby_changed(game_id)
+
+# --- matchmaking
+def rating_for(game_id, name):
+    return ratings.leaderboard(game_id).rating(name)
+
+def match_queue(game_id):
+    q = MATCH_QUEUES.get(game_id)
+    if q is None:
+        q = MATCH_QUEUES[game_id] = MatchQueue(size=2)
+    return q
+
+def seat_match(game_id, group):
+    """Create a table for a matched group, seat everyone and tell them where to go."""
+    t = new_table(game_id, f"Match {_id(4)}", seats=len(group))
+    if not t:
+        for e in group:
+            SID_TO_QUEUE.pop(e.sid, None)
+            socketio_ref.emit('queued', {'error': 'No free tables, try again later'}, room=e.sid, namespace=NS)
+        return None
+    room = room_key(game_id, t['id'])
+    for e in group:
+        queued = SID_TO_QUEUE.pop(e.sid, None)
+        seat_player(game_id, t, e.name, e.sid, guest=bool(queued and queued[2]))
+        socketio_ref.server.enter_room(e.sid, room, namespace=NS)
+        socketio_ref.emit('matched', {'gameId': game_id, 'tableId': t['id']}, room=e.sid, namespace=NS)
+    push_state(game_id, t['id'])
+    return t
+
+# --- table lifecycle
+def table_count():
+    return sum(len(tables) for tables in TABLES.values())
+
+def is_empty(t):
+    return not t['players'] and not t['spectators']
+
+def evict_table(game_id, table_id, reason):
+    """Drop a table and everything that points at it; anyone still there gets table_closed."""
+    t = TABLES.get(game_id, {}).pop(table_id, None)
+    if not t: return
+    DIRTY.pop((game_id, table_id), None)
+    TURN_TIMERS.cancel((game_id, table_id))
+    for pl in t['players']:
+        HELD_SEATS.cancel((game_id, table_id, pl['id']))
+        RESUME_TOKENS.pop(pl['token'], None)
+        if pl['sid']: SID_TO_PLAYER.pop(pl['sid'], None)
+    for sid in t['spectators']:
+        SID_TO_SPECTATOR.pop(sid, None)
+    for room in (room_key(game_id, table_id), spectator_room(game_id, table_id)):
+        socketio_ref.emit('table_closed', {'gameId': game_id, 'tableId': table_id, 'reason': reason},
+                          room=room, namespace=NS)
+        socketio_ref.close_room(room, namespace=NS)
+    for callback in TABLE_EVICTED:
+        callback(game_id, table_id)
+    lobby_changed(game_id)
+    print(f"[GAMES] Evicted {reason} table {game_id}/{table_id} ({len(t['players'])} player(s))")
+
+def make_room():
+    """Evict the longest-untouched empty table to stay under MAX_TABLES; False if there is none."""
+    empty = [(t['touched'], game_id, t['id']) for game_id, tables in TABLES.items()
+             for t in tables.values() if is_empty(t)]
+    if not empty: return False
+    _, game_id, table_id = min(empty)
+    evict_table(game_id, table_id, 'empty')
+    return True
+
+def collect_tables(now=None):
+    """Evict empty and idle tables, then drop sid/token entries whose table or seat is gone."""
+    now = time.monotonic() if now is None else now
+    for game_id, tables in list(TABLES.items()):
+        for table_id, t in list(tables.items()):
+            quiet = now - t['touched']
+            if quiet >= TABLE_IDLE_TTL:
+                evict_table(game_id, table_id, 'idle')
+            elif quiet >= TABLE_EMPTY_TTL and is_empty(t):
+                evict_table(game_id, table_id, 'empty')
+
+    def seat(info):
+        t = TABLES.get(info[0], {}).get(info[1])
+        return next((pl for pl in t['players'] if pl['id'] == info[2]), None) if t else None
+    stale = 0
+    for sid, info in list(SID_TO_PLAYER.items()):
+        p = seat(info)
+        if not p or p['sid'] != sid:
+            del SID_TO_PLAYER[sid]; stale += 1
+    for token, info in list(RESUME_TOKENS.items()):
+        if not seat(info):
+            del RESUME_TOKENS[token]; stale += 1
+    for sid, (game_id, table_id) in list(SID_TO_SPECTATOR.items()):
+        t = TABLES.get(game_id, {}).get(table_id)
+        if not t or sid not in t['spectators']:
+            del SID_TO_SPECTATOR[sid]; stale += 1
+    if stale:
+        print(f"[GAMES] Dropped {stale} stale sid/token entries")
 
-# --- simple deck & rules (placeholder)
-SUITS = ['S', 'H', 'D', 'C']
-RANKS = list(range(2, 15))
+def memory_report(size):
+    """Approximate bytes held by games state; `size(obj)` is a memstats.Sizer."""
+    players = [pl for tables in TABLES.values() for t in tables.values() for pl in t['players']]
+    return {
+        # players first, so the tables figure is everything else a table holds
+        'players': {'count': len(players), 'bytes': size(players)},
+        'tables': {'count': table_count(), 'bytes': size(TABLES)},
+        'sessions': {'count': len(SID_TO_PLAYER) + len(SID_TO_SPECTATOR) + len(SID_TO_QUEUE),
+                     'bytes': size((SID_TO_PLAYER, SID_TO_SPECTATOR, SID_TO_QUEUE, RESUME_TOKENS))},
+        'timers': {'count': len(TURN_TIMERS) + len(HELD_SEATS), 'bytes': size((TURN_TIMERS, HELD_SEATS))},
+        'match_queues': {'count': sum(len(q) for q in MATCH_QUEUES.values()), 'bytes': size(MATCH_QUEUES)},
+    }
 
-def new_deck():
-    deck = [{'r': r, 's': s} for s in SUITS for r in RANKS]
-    random.shuffle(deck)
-    return deque(deck)
+def sweep_loop():
+    """Once a second: retry matchmaking and release seats whose grace period ran out.
+    Every TABLE_GC_EVERY seconds, collect_tables() as well."""
+    next_gc = time.monotonic() + TABLE_GC_EVERY
+    while True:
+        socketio_ref.sleep(SWEEP_EVERY)
+        with app_ref.app_context():
+            if time.monotonic() >= next_gc:
+                collect_tables()
+                next_gc = time.monotonic() + TABLE_GC_EVERY
+            for game_id, q in list(MATCH_QUEUES.items()):
+                if len(q) >= q.size:
+                    for group in q.sweep():
+                        seat_match(game_id, group)
+            for game_id, table_id, pid in HELD_SEATS.pop_due(time.monotonic()):
+                t = TABLES.get(game_id, {}).get(table_id)
+                if not t: continue
+                remove_player(game_id, t, pid)
+                push_state(game_id, table_id)
 
 # --- Socket.IO namespace
 NS = '/games'
 socketio_ref: SocketIO | None = None
+app_ref = None
 
 def room_key(game_id, table_id): return f"g:{game_id}:t:{table_id}"
+def spectator_room(game_id, table_id): return room_key(game_id, table_id) + ":spec"
 
 def init_socketio(socketio: SocketIO, app):
     """Call this once from app.py: init_games(socketio, app)"""
-    global socketio_ref
+    global socketio_ref, app_ref
     socketio_ref = socketio
+    app_ref = app
     app.register_blueprint(bp)
+    socketio.start_background_task(sweep_loop)
+    socketio.start_background_task(turn_timer_loop)
 
     @socketio.on('join_table', namespace=NS)
+    @limited('join_table')
     def join_table(data):
-        game_id = data.get('gameId'); table_id = data.get('tableId'); name = data.get('name')
+        game_id = data.get('gameId'); table_id = data.get('tableId'); name, guest = player_name()
         t = TABLES.get(game_id, {}).get(table_id)
         if not t: return
-        if not any(p['name'] == name for p in t['players']):
+        p = t['by_name'].get(name)
+        if p is None:
             if len(t['players']) >= t['seats']:
                 emit('table_state', {'error': 'Table full'})
                 return
-            p = {'id': _id(), 'name': name, 'sid': flask_request.sid, 'hand': [], 'ready': False, 'score': 0}
-            t['players'].append(p)
-            SID_TO_PLAYER[flask_request.sid] = (game_id, table_id, p['id'])
+            drop_spectator(flask_request.sid)   # a spectator taking a seat stops watching
+            seat_player(game_id, t, name, flask_request.sid, guest)
+        elif p['sid'] is None:
+            # back after a disconnect, on the held seat (what resume does, without the token)
+            drop_spectator(flask_request.sid)
+            rebind_seat(game_id, table_id, p, flask_request.sid)
+            emit('seat', {'gameId': game_id, 'tableId': table_id, 'playerId': p['id'], 'token': p['token']})
         join_room(room_key(game_id, table_id))
         push_state(game_id, table_id)
 
+    @socketio.on('resume', namespace=NS)
+    @limited('resume')
+    def resume(data):
+        """Rebind a held seat to this connection and send only what changed since `version`."""
+        info = RESUME_TOKENS.get(data.get('token'))
+        t = TABLES.get(info[0], {}).get(info[1]) if info else None
+        p = next((pl for pl in t['players'] if pl['id'] == info[2]), None) if t else None
+        if not p:
+            emit('resume_failed', {'error': 'Seat no longer held'})
+            return
+        game_id, table_id, pid = info
+        rebind_seat(game_id, table_id, p, flask_request.sid)
+        join_room(room_key(game_id, table_id))
+        emit('table_delta', delta_since(t, data.get('version'), flask_request.sid))
+
+    @socketio.on('spectate', namespace=NS)
+    @limited('spectate')
+    def spectate(data):
+        game_id = data.get('gameId'); table_id = data.get('tableId')
+        t = TABLES.get(game_id, {}).get(table_id)
+        if not t or flask_request.sid in SID_TO_PLAYER: return
+        if flask_request.sid not in t['spectators']:
+            if len(t['spectators']) >= MAX_SPECTATORS:
+                emit('table_state', {'error': 'Too many spectators'})
+                return
+            drop_spectator(flask_request.sid)
+            t['spectators'].add(flask_request.sid)
+            SID_TO_SPECTATOR[flask_request.sid] = (game_id, table_id)
+            lobby_changed(game_id)
+            join_room(spectator_room(game_id, table_id))
+        emit('table_state', view_for(t))
+
+    @socketio.on('leave_spectate', namespace=NS)
+    @limited('leave_spectate')
+    def leave_spectate(_=None):
+        drop_spectator(flask_request.sid)
+
+    @socketio.on('queue', namespace=NS)
+    @limited('queue')
+    def queue(data):
+        game_id = data.get('gameId'); name, guest = player_name()
+        if game_id not in GAMES_META: return
+        if flask_request.sid in SID_TO_PLAYER:
+            emit('queued', {'error': 'Already seated'})
+            return
+        q = match_queue(game_id)
+        SID_TO_QUEUE[flask_request.sid] = (game_id, name, guest)
+        group = q.enqueue(name, flask_request.sid, rating_for(game_id, name))
+        if group:
+            seat_match(game_id, group)
+        else:
+            emit('queued', {'gameId': game_id, 'waiting': len(q)})
+
+    @socketio.on('leave_queue', namespace=NS)
+    @limited('leave_queue')
+    def leave_queue(_=None):
+        info = SID_TO_QUEUE.pop(flask_request.sid, None)
+        if info:
+            match_queue(info[0]).dequeue(info[1], flask_request.sid)
+
     @socketio.on('ready', namespace=NS)
+    @limited('ready')
     def ready(_):
         game_id, table_id, pid = who()
         if not pid: return
@@ -92,20 +418,21 @@ def init_socketio(socketio: SocketIO, app):
         push_state(game_id, table_id)
 
     @socketio.on('start', namespace=NS)
+    @limited('start')
     def start(_):
         game_id, table_id, _pid = who()
         if not game_id: return
         t = TABLES[game_id][table_id]
         if len(t['players']) < 2: return
         if not all(pl.get('ready') for pl in t['players']): return
-        t['started'] = True; t['turn_idx'] = 0
-        t['deck'] = new_deck()
-        t['table'] = [t['deck'].popleft() for _ in range(4)]
-        for pl in t['players']:
-            pl['hand'] = [t['deck'].popleft() for _ in range(6)]
+        t['started'] = True
+        t['log'] = []; t.pop('analysis', None)
+        xeri_rules.deal(t)
+        TURN_TIMERS.set((game_id, table_id), time.monotonic() + TURN_SECONDS)
         push_state(game_id, table_id)
 
     @socketio.on('action', namespace=NS)
+    @limited('action')
     def action(data):
         game_id, table_id, pid = who()
         if not game_id: return
@@ -114,52 +441,187 @@ def init_socketio(socketio: SocketIO, app):
         idx = int(data.get('index', -1))
         if cur['id'] != pid or not t['started']: return
         if idx < 0 or idx >= len(cur['hand']): return
-        card = cur['hand'].pop(idx)
-        if t['table'] and card['r'] == t['table'][-1]['r']:
-            cur['score'] += len(t['table']) + 1
-            t['table'] = []
-        else:
-            t['table'].append(card)
-        if all(len(p['hand']) == 0 for p in t['players']):
-            if len(t['deck']) >= 6 * len(t['players']):
-                for pl in t['players']:
-                    pl['hand'] = [t['deck'].popleft() for _ in range(6)]
-            else:
-                t['started'] = False
-                for pl in t['players']: pl['ready'] = False
-        if t['started']:
-            t['turn_idx'] = (t['turn_idx'] + 1) % len(t['players'])
-        push_state(game_id, table_id)
+        play_card(game_id, t, idx)
+
+    @socketio.on('hint', namespace=NS)
+    @limited('hint')
+    def hint(_=None):
+        """Expected margin of each card in the asking player's hand, from what they can see."""
+        game_id, table_id, pid = who()
+        if not game_id: return
+        t = TABLES[game_id][table_id]
+        cur = t['players'][t['turn_idx']] if t['players'] else None
+        if not t['started'] or cur['id'] != pid: return
+        est = xeri_analysis.evaluate(xeri_analysis.position(t), sleep=socketio.sleep)
+        best = xeri_analysis.best_rank(est)
+        cards = [{'index': i, 'card': c, 'ev': est[c['r']]['ev'], 'points': est[c['r']]['points']}
+                 for i, c in enumerate(cur['hand'])]
+        emit('hint', {'cards': cards, 'best': next(i for i, c in enumerate(cur['hand']) if c['r'] == best),
+                      'samples': est['samples'], 'version': t['version']})
 
     @socketio.on('disconnect', namespace=NS)
     def disc():
+        ratelimit.forget(flask_request.sid)
+        drop_spectator(flask_request.sid)
+        queued = SID_TO_QUEUE.pop(flask_request.sid, None)
+        if queued:
+            match_queue(queued[0]).dequeue(queued[1], flask_request.sid)
         info = SID_TO_PLAYER.pop(flask_request.sid, None)
         if not info: return
         game_id, table_id, pid = info
         t = TABLES.get(game_id, {}).get(table_id)
         if not t: return
-        t['players'] = [pl for pl in t['players'] if pl['id'] != pid]
-        push_state(game_id, table_id)
+        p = next((pl for pl in t['players'] if pl['id'] == pid), None)
+        if not p: return
+        # hold the seat; the player can come back with their resume token
+        p['sid'] = None
+        HELD_SEATS.set(info, time.monotonic() + SEAT_GRACE)
+        socketio_ref.emit('player_status', {'id': pid, 'connected': False},
+                          room=room_key(game_id, table_id), namespace=NS)
+
+def play_card(game_id, t, idx):
+    """Current player plays hand[idx]; deals, ends the round and re-arms the turn timer as needed."""
+    cur = t['players'][t['turn_idx']]
+    t['log'].append({'seat': t['turn_idx'], 'name': cur['name'], 'pos': xeri_analysis.position(t),
+                     'card': cur['hand'][idx]})
+    end_move(game_id, t, xeri_rules.play(t, idx))
+
+def end_move(game_id, t, round_over):
+    """After a card or a pass: record a finished round, re-arm or cancel the turn timer, push state."""
+    if round_over:
+        t['started'] = False
+        for pl in t['players']: pl['ready'] = False
+        rated = {pl['name']: pl['score'] for pl in t['players'] if not pl['guest']}
+        if len(rated) >= 2:   # guests play unrated
+            ratings.record_result(game_id, t['id'], rated)
+    if t['started']:
+        TURN_TIMERS.set((game_id, t['id']), time.monotonic() + TURN_SECONDS)
+    else:
+        TURN_TIMERS.cancel((game_id, t['id']))
+    push_state(game_id, t['id'])
+
+def auto_play(game_id, t):
+    """Turn deadline passed: play for whoever is on turn - perfectly on the last deal of a
+    2-player table, greedily otherwise. The solver runs on the event loop and a cold
+    2-player last deal takes a few milliseconds; 3-4 player deals can take hundreds."""
+    cur = t['players'][t['turn_idx']]
+    if not cur['hand']:   # seated mid-round: nothing to play until the next deal
+        end_move(game_id, t, xeri_rules.skip(t))
+        return
+    top = t['table'][-1]['r'] if t['table'] else None
+    idx = next((i for i, c in enumerate(cur['hand']) if c['r'] == top), 0)   # capture if we can
+    if len(t['players']) == 2 and last_deal(t):
+        try:
+            idx = xeri_solver.best_index([p['hand'] for p in t['players']], t['table'], t['turn_idx'])
+        except ValueError:   # someone left mid-deal; hands no longer line up
+            pass
+    play_card(game_id, t, idx)
+
+def turn_timer_loop():
+    """The one scheduler for every table's turn deadline."""
+    while True:
+        nxt = TURN_TIMERS.next_deadline()
+        wait = 1.0 if nxt is None else nxt - time.monotonic()
+        socketio_ref.sleep(min(max(wait, 0.01), 1.0))
+        fired = TURN_TIMERS.pop_due(time.monotonic())
+        if not fired: continue
+        TURN_FIRES.hit(len(fired))
+        with app_ref.app_context():
+            for game_id, table_id in fired:
+                t = TABLES.get(game_id, {}).get(table_id)
+                if t and t['started'] and t['players']:
+                    auto_play(game_id, t)
+
+def player_name():
+    """(name, guest) for whoever is sitting down: the logged-in user, else a guest name
+    that lasts for this connection. Never the client's say-so, since ratings key on it."""
+    username = session.get('username')
+    if username:
+        return username, False
+    return session.setdefault('guest_name', f"Guest {_id(4)}"), True
 
 def who():
     info = SID_TO_PLAYER.get(flask_request.sid)
     return info or (None, None, None)
 
-def view_for(t, viewer_sid):
+def drop_spectator(sid):
+    info = SID_TO_SPECTATOR.pop(sid, None)
+    if not info: return
+    t = TABLES.get(info[0], {}).get(info[1])
+    if t: t['spectators'].discard(sid)
+    lobby_changed(info[0])
+    socketio_ref.server.leave_room(sid, spectator_room(*info), namespace=NS)
+
+def view_for(t, viewer_sid=None):
+    """State as seen by one seated player; with no viewer, the public (spectator) view."""
     out_players = []
     for pl in t['players']:
-        hand = pl['hand'] if pl['sid'] == viewer_sid else ([{'r': '?', 's': '?'}] * len(pl['hand']))
-        out_players.append({'id': pl['id'], 'name': pl['name'], 'ready': pl.get('ready', False), 'hand': hand})
+        mine = viewer_sid is not None and pl['sid'] == viewer_sid
+        hand = pl['hand'] if mine else ([{'r': '?', 's': '?'}] * len(pl['hand']))
+        out_players.append({'id': pl['id'], 'name': pl['name'], 'ready': pl.get('ready', False), 'hand': hand,
+                            'connected': pl['sid'] is not None})
     return {
         'table': {'id': t['id'], 'name': t['name']},
         'players': out_players,
         'table': t['table'],
         'started': t['started'],
-        'turn': t['players'][t['turn_idx']]['id'] if t['players'] else None
+        'turn': t['players'][t['turn_idx']]['id'] if t['players'] else None,
+        'spectators': len(t['spectators']),
+        'version': t['version'],
     }
 
+def delta_since(t, version, viewer_sid):
+    """Keys of the viewer's state that changed after `version`; everything if that is too old."""
+    view = view_for(t, viewer_sid)
+    log = t['changes']
+    if version is None or not log or version < log[0][0] - 1 or version > t['version']:
+        return {'full': True, 'version': t['version'], 'state': view}
+    keys = set()
+    for v, changed in log:
+        if v > version:
+            keys |= changed
+    keys.discard('version')
+    return {'full': False, 'version': t['version'], 'changes': {k: view[k] for k in keys}}
+
 def push_state(game_id, table_id):
+    """Mark the table dirty. Handlers often change a table several times in a row (ready then
+    start, a seat released mid-deal); the flush sends only the state it ends up in."""
+    STATE_STATS['marked'] += 1
+    if socketio_ref is None:
+        send_state(game_id, table_id)
+        return
+    if not DIRTY:
+        socketio_ref.start_background_task(flush_states)
+    DIRTY.setdefault((game_id, table_id), time.monotonic())
+
+def flush_states():
+    """Send table_state once for every table marked since the last flush."""
+    socketio_ref.sleep(STATE_FLUSH_MS / 1000)
+    batch = list(DIRTY.items())
+    DIRTY.clear()   # tables marked while this flush emits get the next one
+    STATE_STATS['flushes'] += 1
+    now = time.monotonic()
+    with app_ref.app_context():
+        for (game_id, table_id), marked in batch:
+            STATE_STATS['max_delay_ms'] = max(STATE_STATS['max_delay_ms'], round((now - marked) * 1000, 1))
+            try:
+                send_state(game_id, table_id)
+            except Exception as e:   # one bad table must not hold back the others
+                print(f"[GAMES] State flush failed for {game_id}/{table_id}: {e!r}")
+
+def send_state(game_id, table_id):
     t = TABLES.get(game_id, {}).get(table_id)
     if not t: return
+    STATE_STATS['sent'] += 1
+    t['version'] += 1
+    t['touched'] = time.monotonic()
+    public = view_for(t)
+    last = t['last_public']
+    t['changes'].append((t['version'], frozenset(k for k in public if public[k] != last.get(k))))
+    t['last_public'] = public
     for pl in t['players']:
+        if pl['sid'] is None or not ratelimit.writable(pl['sid'], NS): continue
         socketio_ref.emit('table_state', view_for(t, pl['sid']), room=pl['sid'], namespace=NS)
+    if t['spectators']:
+        # one packet, encoded once by the manager and fanned out to every watcher
+        socketio_ref.emit('table_state', public, room=spectator_room(game_id, table_id), namespace=NS)
@@ -0,0 +1,104 @@
+# matchmaking.py
+# Rating-ordered waiting queue. Players are matched with their nearest
+# neighbours in rating; the acceptable rating gap widens the longer the
+# anchor player has waited, so nobody queues forever at off-peak hours.
+import time
+
+from ordered import OrderedIndex
+
+DEFAULT_RATING = 1200
+
+
+class Entry:
+    __slots__ = ('name', 'sid', 'rating', 'since')
+
+    def __init__(self, name, sid, rating, since):
+        self.name = name
+        self.sid = sid
+        self.rating = rating
+        self.since = since
+
+    @property
+    def key(self):
+        return (self.rating, self.since, self.name)
+
+
+class MatchQueue:
+    def __init__(self, size=2, base_window=100, widen_per_sec=20, max_window=800, clock=time.monotonic):
+        self.size = size
+        self.base_window = base_window
+        self.widen_per_sec = widen_per_sec
+        self.max_window = max_window
+        self.clock = clock
+        self.entries = {}            # { name: Entry }, in enqueue order
+        self.index = OrderedIndex()  # of Entry.key
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def window(self, entry, now):
+        return min(self.base_window + (now - entry.since) * self.widen_per_sec, self.max_window)
+
+    def enqueue(self, name, sid, rating=DEFAULT_RATING):
+        """Add a player; returns a full group of Entries if one could be formed."""
+        self.dequeue(name)
+        e = Entry(name, sid, rating, self.clock())
+        self.entries[name] = e
+        self.index.add(e.key)
+        return self._match(e, self.clock())
+
+    def dequeue(self, name, sid=None):
+        """Remove `name` (only if still queued from `sid`, when given)."""
+        e = self.entries.get(name)
+        if e is None or (sid is not None and e.sid != sid):
+            return None
+        del self.entries[name]
+        self.index.remove(e.key)
+        return e
+
+    def _match(self, anchor, now):
+        """Take the size-1 nearest neighbours of `anchor` if they are all within its window."""
+        need = self.size - 1
+        if len(self.index) < self.size:
+            return None
+        keys = self.index
+        pos = keys.rank(anchor.key)
+        lo, hi = pos - 1, pos + 1
+        limit = self.window(anchor, now)
+        picked = []
+        while len(picked) < need:
+            left = keys[lo] if lo >= 0 else None
+            right = keys[hi] if hi < len(keys) else None
+            dl = anchor.rating - left[0] if left else None
+            dr = right[0] - anchor.rating if right else None
+            if dl is None and dr is None:
+                return None
+            if dr is None or (dl is not None and dl <= dr):
+                gap, key = dl, left
+                lo -= 1
+            else:
+                gap, key = dr, right
+                hi += 1
+            if gap > limit:
+                return None
+            picked.append(key)
+        group = [anchor] + [self.entries[k[2]] for k in picked]
+        for e in group:
+            self.dequeue(e.name)
+        return group
+
+    def sweep(self):
+        """Retry everyone, longest-waiting first, with their widened windows."""
+        now = self.clock()
+        groups = []
+        for name in list(self.entries):
+            e = self.entries.get(name)
+            if e is None:
+                continue   # already matched earlier in this sweep
+            group = self._match(e, now)
+            if group:
+                groups.append(group)
+        return groups
@@ -0,0 +1,50 @@
+# memstats.py
+# Approximate deep sizes of in-memory state, for /admin/memory.
+# sys.getsizeof over everything reachable through containers and instance
+# attributes; functions, classes and modules are not followed. A Sizer
+# counts each object once, so whatever two sections share is charged to the
+# one measured first. Interned small ints and strings are counted too, so
+# the numbers run a little high - they are for spotting growth, not billing.
+from collections import deque
+import sys, types
+
+_LEAVES = (str, bytes, bytearray, int, float, bool, complex, type(None))
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+           types.MethodType, types.CodeType, types.FrameType)
+YIELD_EVERY = 10_000   # objects between sleep(0) calls on big structures
+
+
+class Sizer:
+    def __init__(self, sleep=None):
+        self.seen = {}   # { id: obj } - holding obj keeps its id from being reused
+        self.sleep = sleep
+        self.objects = 0
+
+    def __call__(self, obj):
+        """Bytes reachable from `obj` that no earlier call has counted."""
+        total = 0
+        stack = [obj]
+        while stack:
+            o = stack.pop()
+            if id(o) in self.seen or isinstance(o, _OPAQUE):
+                continue
+            self.seen[id(o)] = o
+            total += sys.getsizeof(o, 0)
+            self.objects += 1
+            if self.sleep and self.objects % YIELD_EVERY == 0:
+                self.sleep(0)
+            if isinstance(o, _LEAVES):
+                continue
+            if isinstance(o, dict):
+                stack.extend(o.keys())
+                stack.extend(o.values())
+            elif isinstance(o, (list, tuple, set, frozenset, deque)):
+                stack.extend(o)
+            else:
+                d = getattr(o, '__dict__', None)
+                if d is not None:
+                    stack.append(d)
+                for name in getattr(type(o), '__slots__', ()):
+                    if hasattr(o, name):
+                        stack.append(getattr(o, name))
+        return total
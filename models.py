@@ -1,7 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.asyncio import create_async_engine
 from datetime import datetime
 
-db = SQLAlchemy()
+from replicas import RoutingSession
+
+
+class _SQLAlchemy(SQLAlchemy):
+    """With app.config['DB_ASYNC'] set (SERVER_MODE=asgi), every engine is the sync face of
+    create_async_engine(): the ORM stays synchronous and the asyncio driver underneath
+    is awaited from the greenlet each handler runs in (asgi.py, greenlet_spawn) - what
+    AsyncSession does internally. _make_engine is Flask-SQLAlchemy's engine factory;
+    Flask-SQLAlchemy and SQLAlchemy are pinned in requirements.txt for it."""
+
+    def _make_engine(self, bind_key, options, app):
+        if app.config.get('DB_ASYNC'):
+            options = dict(options)
+            return create_async_engine(options.pop('url'), **options).sync_engine
+        return super()._make_engine(bind_key, options, app)
+
+
+db = _SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,4 +31,31 @@ class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), nullable=False)
     text = db.Column(db.Text, nullable=False)
+    rendered = db.Column(db.Text)   # sanitized HTML, produced once at write time
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    room = db.Column(db.String(64), nullable=False, default='global', server_default='global')
+    __table_args__ = (db.Index('ix_message_room_id', 'room', 'id'),)
+
+class Rating(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), nullable=False)
+    game = db.Column(db.String(32), nullable=False)
+    rating = db.Column(db.Float, nullable=False, default=1200.0)
+    games = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.UniqueConstraint('username', 'game'),
+        db.Index('ix_rating_game_rating', 'game', 'rating'),
+    )
+
+class GameResult(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    game = db.Column(db.String(32), nullable=False)
+    table_id = db.Column(db.String(16))
+    scores = db.Column(db.JSON, nullable=False)   # { username: score }
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ReplicaHeartbeat(db.Model):
+    """One row, bumped on the primary by replicas.monitor(); its age on a replica is that replica's lag."""
+    __tablename__ = 'replica_heartbeat'
+    id = db.Column(db.Integer, primary_key=True)
+    at = db.Column(db.Float, nullable=False)   # time.time()
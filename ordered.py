@@ -0,0 +1,154 @@
+# ordered.py
+# A sorted collection of comparable keys, SortedList-style: the keys live in
+# sublists of at most 2 * LOAD, each sorted, with a parallel list of their
+# maxima to bisect over and a Fenwick tree of their lengths for positions.
+# add/remove are a bisect over the maxima, a shift inside one bounded
+# sublist and an O(log n) tree update; rank and indexing are a tree walk plus
+# a bisect. Splitting or dropping a sublist rebuilds the tree in O(n / LOAD),
+# which happens once per LOAD inserts or removals at most.
+from bisect import bisect_left, bisect_right, insort
+
+LOAD = 256
+
+
+class OrderedIndex:
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self._lists = [keys[i:i + LOAD] for i in range(0, len(keys), LOAD)]
+        self._maxes = [sub[-1] for sub in self._lists]
+        self._len = len(keys)
+        self._rebuild()
+
+    # --- Fenwick tree over sublist lengths
+    def _rebuild(self):
+        tree = [0] + [len(sub) for sub in self._lists]
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _grow(self, i, delta):
+        i += 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _before(self, i):
+        """Keys in the sublists ahead of sublist i."""
+        total = 0
+        while i:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, pos):
+        """(sublist, offset) of position pos, 0 <= pos < len."""
+        i, step = 0, 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            j = i + step
+            if j < len(self._tree) and self._tree[j] <= pos:
+                pos -= self._tree[j]
+                i = j
+            step >>= 1
+        return i, pos
+
+    # --- container protocol
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for sub in self._lists:
+            yield from sub
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("OrderedIndex index out of range")
+        s, j = self._locate(i)
+        return self._lists[s][j]
+
+    def __contains__(self, key):
+        s = bisect_left(self._maxes, key)
+        if s == len(self._maxes):
+            return False
+        sub = self._lists[s]
+        return sub[bisect_left(sub, key)] == key
+
+    def add(self, key):
+        if not self._maxes:
+            self._lists.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._rebuild()
+            return
+        s = bisect_left(self._maxes, key)
+        if s == len(self._maxes):
+            s -= 1
+            self._lists[s].append(key)
+            self._maxes[s] = key
+        else:
+            insort(self._lists[s], key)
+        self._len += 1
+        sub = self._lists[s]
+        if len(sub) > 2 * LOAD:
+            self._lists.insert(s + 1, sub[LOAD:])
+            del sub[LOAD:]
+            self._maxes[s] = sub[-1]
+            self._maxes.insert(s + 1, self._lists[s + 1][-1])
+            self._rebuild()
+        else:
+            self._grow(s, 1)
+
+    def remove(self, key):
+        s = bisect_left(self._maxes, key)
+        if s == len(self._maxes):
+            return False
+        sub = self._lists[s]
+        j = bisect_left(sub, key)
+        if sub[j] != key:
+            return False
+        del sub[j]
+        self._len -= 1
+        if sub:
+            self._maxes[s] = sub[-1]
+            self._grow(s, -1)
+        else:
+            del self._lists[s]
+            del self._maxes[s]
+            self._rebuild()
+        return True
+
+    def rank(self, key):
+        """Position `key` has (or would have) in sort order."""
+        s = bisect_left(self._maxes, key)
+        if s == len(self._maxes):
+            return self._len
+        return self._before(s) + bisect_left(self._lists[s], key)
+
+    def slice(self, start, stop):
+        start, stop = max(start, 0), min(max(stop, 0), self._len)
+        out = []
+        if start >= stop:
+            return out
+        s, j = self._locate(start)
+        while len(out) < stop - start:
+            sub = self._lists[s]
+            out.extend(sub[j:j + stop - start - len(out)])
+            s, j = s + 1, 0
+        return out
+
+    def irange(self, lo, hi):
+        """Keys with lo <= key <= hi."""
+        out = []
+        s = bisect_left(self._maxes, lo)
+        j = bisect_left(self._lists[s], lo) if s < len(self._lists) else 0
+        while s < len(self._lists):
+            sub = self._lists[s]
+            k = bisect_right(sub, hi, j)
+            out.extend(sub[j:k])
+            if k < len(sub):
+                break
+            s, j = s + 1, 0
+        return out
@@ -0,0 +1,212 @@
+# presence.py
+# AFK tracking driven by deadlines instead of polling: touch() is O(1) and the
+# afk/active callbacks fire only when a user actually crosses the threshold.
+import os, time
+
+from timers import DeadlineHeap
+
+AFK_AFTER = 5 * 60   # seconds
+
+
+class IdleDetector:
+    def __init__(self, threshold=AFK_AFTER, on_change=None, clock=time.monotonic):
+        self.threshold = threshold
+        self.on_change = on_change or (lambda user, afk: None)
+        self.clock = clock
+        self.timers = DeadlineHeap()
+        self.afk = set()
+
+    def touch(self, user):
+        """Record activity; fires an 'active' transition if the user was AFK."""
+        self.timers.set(user, self.clock() + self.threshold)
+        if user in self.afk:
+            self.afk.discard(user)
+            self.on_change(user, False)
+
+    def remove(self, user):
+        self.timers.cancel(user)
+        self.afk.discard(user)
+
+    def is_afk(self, user):
+        return user in self.afk
+
+    def tick(self, now=None):
+        """Mark everyone past the threshold as AFK. Returns the newly AFK users."""
+        went_afk = self.timers.pop_due(self.clock() if now is None else now)
+        for user in went_afk:
+            self.afk.add(user)
+            self.on_change(user, True)
+        return went_afk
+
+    def run(self, sleep):
+        """Background loop: sleep until the next deadline, then tick."""
+        while True:
+            nxt = self.timers.next_deadline()
+            wait = self.threshold if nxt is None else nxt - self.clock()
+            sleep(min(max(wait, 0.05), self.threshold))
+            self.tick()
+
+
+# === Session / presence registry ===
+# Who is logged in, as heartbeat-renewed leases. A tab that dies without a
+# clean disconnect simply stops renewing and its lease expires after LEASE_TTL.
+
+LEASE_TTL = 60           # seconds without a heartbeat before a lease expires
+HEARTBEAT_EVERY = 20     # what clients are asked to use
+
+
+class MemoryBackend:
+    """Process-local leases: { username: (owner, expires) }."""
+    shared = False
+
+    def __init__(self):
+        self.leases = {}
+
+    def acquire(self, user, owner, expires, now):
+        cur = self.leases.get(user)
+        if cur and cur[0] != owner and cur[1] > now:
+            return False
+        self.leases[user] = (owner, expires)
+        return True
+
+    def renew(self, user, owner, expires):
+        cur = self.leases.get(user)
+        if not cur or cur[0] != owner:
+            return False
+        self.leases[user] = (owner, expires)
+        return True
+
+    def release(self, user, owner=None):
+        cur = self.leases.get(user)
+        if cur and (owner is None or cur[0] == owner):
+            del self.leases[user]
+            return True
+        return False
+
+    def expire(self, now):
+        gone = [u for u, (_, exp) in self.leases.items() if exp <= now]
+        for u in gone:
+            del self.leases[u]
+        return gone
+
+    def live(self, now):
+        return self.leases
+
+
+class SQLiteBackend:
+    """Leases in a local SQLite file, shared by every worker on the host."""
+    shared = True
+
+    def __init__(self, path):
+        import sqlite3
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=1, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " username TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+    def acquire(self, user, owner, expires, now):
+        cur = self.conn.execute(
+            "INSERT INTO leases (username, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(username) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.owner = excluded.owner OR leases.expires <= ?",
+            (user, owner, expires, now))
+        return cur.rowcount == 1
+
+    def renew(self, user, owner, expires):
+        cur = self.conn.execute(
+            "UPDATE leases SET expires = ? WHERE username = ? AND owner = ?", (expires, user, owner))
+        return cur.rowcount == 1
+
+    def release(self, user, owner=None):
+        if owner is None:
+            cur = self.conn.execute("DELETE FROM leases WHERE username = ?", (user,))
+        else:
+            cur = self.conn.execute("DELETE FROM leases WHERE username = ? AND owner = ?", (user, owner))
+        return cur.rowcount == 1
+
+    def expire(self, now):
+        return [row[0] for row in self.conn.execute(
+            "DELETE FROM leases WHERE expires <= ? RETURNING username", (now,))]
+
+    def live(self, now):
+        return {u: (o, e) for u, o, e in self.conn.execute(
+            "SELECT username, owner, expires FROM leases WHERE expires > ?", (now,))}
+
+
+def make_backend(name=None):
+    name = name or os.environ.get("PRESENCE_BACKEND", "memory")
+    if name == "sqlite":
+        return SQLiteBackend(os.environ.get("PRESENCE_DB", "instance/presence.sqlite3"))
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown PRESENCE_BACKEND {name!r}")
+
+
+class PresenceRegistry:
+    def __init__(self, backend, ttl=LEASE_TTL, on_expire=None, clock=time.time, cache_ttl=1.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.on_expire = on_expire or (lambda user: None)
+        self.clock = clock
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_at = float('-inf')
+
+    def _view(self):
+        """{ user: (owner, expires) }. Shared backends are read at most once per cache_ttl."""
+        if not self.backend.shared:
+            return self.backend.leases
+        now = self.clock()
+        if now - self._cache_at >= self.cache_ttl:
+            self._cache = self.backend.live(now)
+            self._cache_at = now
+        return self._cache
+
+    def claim(self, user, owner):
+        """Take the user's lease; fails if someone else holds a live one."""
+        now = self.clock()
+        ok = self.backend.acquire(user, owner, now + self.ttl, now)
+        if ok and self.backend.shared:
+            self._cache[user] = (owner, now + self.ttl)
+        return ok
+
+    def heartbeat(self, user, owner):
+        expires = self.clock() + self.ttl
+        ok = self.backend.renew(user, owner, expires)
+        if ok and self.backend.shared:
+            self._cache[user] = (owner, expires)
+        return ok
+
+    def release(self, user, owner=None):
+        ok = self.backend.release(user, owner)
+        if ok and self.backend.shared:
+            self._cache.pop(user, None)
+        return ok
+
+    def holder(self, user):
+        lease = self._view().get(user)
+        return lease[0] if lease and lease[1] > self.clock() else None
+
+    def is_online(self, user):
+        return self.holder(user) is not None
+
+    def online(self):
+        now = self.clock()
+        return [u for u, (_, exp) in self._view().items() if exp > now]
+
+    def sweep(self):
+        gone = self.backend.expire(self.clock())
+        for user in gone:
+            self._cache.pop(user, None)
+            self.on_expire(user)
+        return gone
+
+    def run(self, sleep):
+        while True:
+            sleep(self.ttl / 4)
+            self.sweep()
@@ -0,0 +1,210 @@
+# ratelimit.py
+# Token buckets for Socket.IO events, per sid and per user, with per-event
+# budgets and payload caps. Wrap handlers with @limited('event') right under
+# @socketio.on(...). Violations are dropped; repeat offenders are disconnected,
+# except for SOFT_EVENTS, which the UI sends on its own (one per keystroke):
+# their overflow is dropped without a strike.
+from collections import Counter
+from functools import wraps
+import json, os, time
+
+from flask import current_app, request, session
+from flask_socketio import disconnect
+
+# { event: (tokens per second, burst, max payload bytes) }
+EVENT_BUDGETS = {
+    'chat':           (1.0, 5, 300_000),   # room for one base64 image
+    'chat_message':   (1.0, 5, 8_000),
+    'join_room':      (0.5, 3, 256),
+    'typing':         (4.0, 8, 64),
+    'stop_typing':    (4.0, 8, 64),
+    'heartbeat':      (0.5, 3, 64),
+    'delete_message': (5.0, 20, 64),
+    'delete_messages': (1.0, 5, 16_000),   # up to a few thousand ids
+    'delete_user_messages': (1.0, 5, 256),
+    'purge_images':   (0.2, 2, 256),
+    'mute_user':      (1.0, 5, 256),
+    'unmute_user':    (1.0, 5, 256),
+    'join_table':     (0.5, 3, 512),
+    'ready':          (1.0, 3, 256),
+    'start':          (1.0, 3, 256),
+    'action':         (4.0, 6, 256),
+    'hint':           (0.5, 3, 64),
+    'resume':         (0.5, 3, 256),
+    'spectate':       (0.5, 3, 512),
+    'leave_spectate': (1.0, 3, 64),
+    'queue':          (0.5, 3, 256),
+    'leave_queue':    (1.0, 3, 64),
+}
+DEFAULT_BUDGET = (2.0, 10, 4_096)
+SOFT_EVENTS = {'typing', 'stop_typing'}
+
+# engine.io rejects anything larger before it is even parsed
+MAX_HTTP_BUFFER = int(os.environ.get("SOCKET_MAX_PAYLOAD", 512 * 1024))
+MAX_QUEUED = int(os.environ.get("SOCKET_MAX_QUEUED", 256))   # pending outgoing packets per client
+STRIKES_TO_DISCONNECT = 20
+STRIKE_WINDOW = 60
+PRUNE_EVERY = 60   # seconds between sweeps of idle user buckets
+
+stats = Counter()
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self, n=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+
+_sid_buckets = {}    # { sid: { event: TokenBucket } }
+_user_buckets = {}   # { username: { event: TokenBucket } }
+_strikes = {}        # { sid: (count, window_start) }
+_next_prune = time.monotonic() + PRUNE_EVERY
+_slow = {}           # { sid: namespace } last seen with MAX_QUEUED or more packets waiting
+
+
+def _bucket(table, key, event):
+    per = table.get(key)
+    if per is None:
+        per = table[key] = {}
+    b = per.get(event)
+    if b is None:
+        rate, burst, _ = EVENT_BUDGETS.get(event, DEFAULT_BUDGET)
+        b = per[event] = TokenBucket(rate, burst)
+    return b
+
+
+def _size(payload):
+    if payload is None:
+        return 0
+    if isinstance(payload, (str, bytes)):
+        return len(payload)
+    if isinstance(payload, (int, float, bool)):
+        return 8
+    return len(json.dumps(payload, separators=(',', ':'), default=str))
+
+
+def _queued(server, sid, namespace):
+    eio_sid = server.manager.eio_sid_from_sid(sid, namespace)
+    sock = server.eio.sockets.get(eio_sid) if eio_sid else None
+    return sock.queue.qsize() if sock else 0
+
+
+def backlog(sid, namespace='/'):
+    """Packets queued for a client but not yet flushed to it (0 if unknown).
+    Also files the client under slow consumers, or takes it off, for slow_sids()."""
+    queued = _queued(current_app.extensions['socketio'].server, sid, namespace)
+    if queued >= MAX_QUEUED:
+        _slow[sid] = namespace
+    else:
+        _slow.pop(sid, None)
+    return queued
+
+
+def writable(sid, namespace='/'):
+    """False for slow consumers whose queue is already full; callers skip the emit."""
+    if backlog(sid, namespace) >= MAX_QUEUED:
+        stats['slow_skipped'] += 1
+        return False
+    return True
+
+
+def slow_sids(server, also=None):
+    """The skip_sid for a broadcast: known slow consumers that are still backed up, plus
+    `also`. Clients are found slow by backlog() on their own events (at least the 20 s
+    heartbeat) and per-sid sends, so this costs O(slow clients), not O(connections)."""
+    skip = [also] if also else []
+    for sid, namespace in list(_slow.items()):
+        if _queued(server, sid, namespace) >= MAX_QUEUED:
+            skip.append(sid)
+            stats['slow_skipped'] += 1
+        else:
+            del _slow[sid]   # drained
+    return skip or None
+
+
+def _full(per, now):
+    return all(b.tokens + (now - b.stamp) * b.rate >= b.burst for b in per.values())
+
+
+def prune(now=None):
+    """Drop user buckets that have refilled; a fresh bucket behaves the same."""
+    global _next_prune
+    now = time.monotonic() if now is None else now
+    _next_prune = now + PRUNE_EVERY
+    for user in [u for u, per in _user_buckets.items() if _full(per, now)]:
+        del _user_buckets[user]
+
+
+def _strike(sid, reason):
+    stats[reason] += 1
+    now = time.monotonic()
+    count, start = _strikes.get(sid, (0, now))
+    if now - start > STRIKE_WINDOW:
+        count, start = 0, now
+    count += 1
+    _strikes[sid] = (count, start)
+    if count >= STRIKES_TO_DISCONNECT:
+        stats['disconnects'] += 1
+        print(f"[RATELIMIT] Disconnecting {session.get('username') or sid} ({reason})")
+        forget(sid)
+        disconnect()
+
+
+def _over(sid, reason, event):
+    if event in SOFT_EVENTS:
+        stats[reason] += 1   # dropped, no strike
+    else:
+        _strike(sid, reason)
+
+
+def check(event, args):
+    """True if the current client may run `event` with `args` right now."""
+    sid = request.sid
+    if time.monotonic() >= _next_prune:
+        prune()
+    _, _, max_bytes = EVENT_BUDGETS.get(event, DEFAULT_BUDGET)
+    if sum(_size(a) for a in args) > max_bytes:
+        _strike(sid, f'{event}.too_large')
+        return False
+    if backlog(sid, request.namespace) >= MAX_QUEUED * 4:
+        _strike(sid, f'{event}.backlogged')
+        return False
+    if not _bucket(_sid_buckets, sid, event).take():
+        _over(sid, f'{event}.sid_rate', event)
+        return False
+    username = session.get('username')
+    if username and not _bucket(_user_buckets, username, event).take():
+        _over(sid, f'{event}.user_rate', event)
+        return False
+    stats[f'{event}.ok'] += 1
+    return True
+
+
+def limited(event):
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args):
+            if not check(event, args):
+                return None
+            return handler(*args)
+        return wrapper
+    return decorator
+
+
+def forget(sid):
+    _sid_buckets.pop(sid, None)
+    _slow.pop(sid, None)
+    _strikes.pop(sid, None)
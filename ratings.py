@@ -0,0 +1,114 @@
+# ratings.py
+# Per-game Elo ratings. Results and rating changes are written in one commit;
+# an in-memory leaderboard (ordered by rating) is updated write-through so
+# top-N and rank lookups never sort the table.
+from models import db, Rating, GameResult
+from matchmaking import DEFAULT_RATING
+from ordered import OrderedIndex
+
+K_FACTOR = 32
+
+
+def elo_update(ratings, scores, k=K_FACTOR):
+    """Multiplayer Elo: every pair of players is one game, scaled by 1/(n-1).
+
+    ratings: { name: rating }, scores: { name: points this round }.
+    Returns { name: new rating }.
+    """
+    names = list(scores)
+    n = len(names)
+    if n < 2:
+        return dict(ratings)
+    out = {}
+    for a in names:
+        ra = ratings[a]
+        delta = 0.0
+        for b in names:
+            if a == b: continue
+            expected = 1 / (1 + 10 ** ((ratings[b] - ra) / 400))
+            actual = 1.0 if scores[a] > scores[b] else 0.5 if scores[a] == scores[b] else 0.0
+            delta += actual - expected
+        out[a] = ra + k * delta / (n - 1)
+    return out
+
+
+class Leaderboard:
+    """Ratings for one game, ordered best-first by (-rating, name)."""
+
+    def __init__(self, rows=()):
+        self.ratings = dict(rows)
+        self.index = OrderedIndex((-r, name) for name, r in self.ratings.items())
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def rating(self, name):
+        return self.ratings.get(name, DEFAULT_RATING)
+
+    def set(self, name, rating):
+        old = self.ratings.get(name)
+        if old is not None:
+            self.index.remove((-old, name))
+        self.ratings[name] = rating
+        self.index.add((-rating, name))
+
+    def rank(self, name):
+        """1-based rank, or None if the player has no rating yet."""
+        r = self.ratings.get(name)
+        return None if r is None else self.index.rank((-r, name)) + 1
+
+    def _rows(self, start, stop):
+        return [{'rank': start + i + 1, 'name': name, 'rating': round(-neg)}
+                for i, (neg, name) in enumerate(self.index.slice(start, stop))]
+
+    def top(self, n):
+        return self._rows(0, n)
+
+    def around(self, name, k):
+        rank = self.rank(name)
+        if rank is None:
+            return None, []
+        return rank, self._rows(rank - 1 - k, rank + k)
+
+
+LEADERBOARDS = {}   # { game: Leaderboard }, loaded lazily
+
+
+def leaderboard(game):
+    lb = LEADERBOARDS.get(game)
+    if lb is None:
+        rows = (db.session.query(Rating.username, Rating.rating)
+                .filter(Rating.game == game)
+                .order_by(Rating.rating.desc())   # served by ix_rating_game_rating
+                .all())
+        lb = LEADERBOARDS[game] = Leaderboard(rows)
+    return lb
+
+
+def record_result(game, table_id, scores):
+    """Persist a finished round and everyone's new rating in a single commit."""
+    names = list(scores)
+    rows = {r.username: r for r in Rating.query.filter(Rating.game == game, Rating.username.in_(names))}
+    current = {name: rows[name].rating if name in rows else DEFAULT_RATING for name in names}
+    new = elo_update(current, scores)
+
+    for name in names:
+        row = rows.get(name)
+        if row is None:
+            row = Rating(username=name, game=game, rating=DEFAULT_RATING, games=0)
+            db.session.add(row)
+        row.rating = new[name]
+        row.games = (row.games or 0) + 1
+    db.session.add(GameResult(game=game, table_id=table_id, scores=scores))
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"[RATINGS] Failed to record {game} result for {names}: {e}")
+        return None
+
+    lb = LEADERBOARDS.get(game)
+    if lb is not None:
+        for name in names:
+            lb.set(name, new[name])
+    return new
@@ -0,0 +1,149 @@
+# replicas.py
+# Optional read replicas.
+#
+#   DATABASE_REPLICA_URLS=postgresql://replica1/...,postgresql://replica2/...
+#
+# Each URL becomes a Flask-SQLAlchemy bind (replica0, replica1, ...).
+# RoutingSession, the session class of models.db, sends plain SELECTs to a
+# healthy replica and everything else - writes, SELECT ... FOR UPDATE, text()
+# statements, anything inside a flush - to the primary. Someone who just wrote
+# reads from the primary for RYW_SECONDS afterwards, so they see their own
+# writes. That is tracked per username in this process and with an rw_until
+# timestamp in the Flask session cookie, which also covers anonymous flows
+# such as register -> login and other workers. Later reads in a transaction
+# that has written also stay on the primary.
+#
+# monitor() writes time.time() to the replica_heartbeat row on the primary
+# every CHECK_EVERY seconds and reads it back from each replica. The
+# difference is that replica's lag. A replica that lags more than MAX_LAG or
+# cannot be reached takes no reads until it catches up; with none healthy,
+# every read goes to the primary. Works with any replication that copies
+# tables, including two SQLite files kept in sync by hand for testing.
+import itertools, os, time
+
+from flask import has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, select, update
+from sqlalchemy.sql import Select
+
+RYW_SECONDS = float(os.environ.get("REPLICA_RYW_SECONDS", 5))
+MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", 2))
+CHECK_EVERY = float(os.environ.get("REPLICA_CHECK_EVERY", 1))
+
+NAMES = []          # bind keys of the configured replicas
+HEALTHY = []        # the subset currently taking reads
+LAG = {}            # { name: seconds behind the primary, None if unreachable }
+RECENT_WRITERS = {}   # { username: monotonic time their read-your-writes window ends }
+stats = {'replica_reads': 0, 'txn_reads': 0, 'ryw_reads': 0, 'fallbacks': 0}
+_next = itertools.count()
+
+
+def configure(app, urls, engine_options=None):
+    """Register one bind per replica URL; call before db.init_app(app)."""
+    NAMES[:] = []
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for i, url in enumerate(urls):
+        name = f"replica{i}"
+        binds[name] = dict(engine_options or {}, url=url)
+        NAMES.append(name)
+        LAG[name] = None
+
+
+def _is_read(clause):
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+def recently_wrote():
+    if not has_request_context():
+        return False
+    if session.get('rw_until', 0) > time.time():
+        return True
+    user = session.get('username')
+    return bool(user) and RECENT_WRITERS.get(user, 0) > time.monotonic()
+
+
+def wrote():
+    """Open the read-your-writes window for whoever is making this request."""
+    if not has_request_context():
+        return
+    session['rw_until'] = time.time() + RYW_SECONDS
+    user = session.get('username')
+    if user:
+        RECENT_WRITERS[user] = time.monotonic() + RYW_SECONDS
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and NAMES:
+            if not _is_read(clause) or self._flushing:
+                self.info['wrote'] = True
+            elif self.info.get('wrote'):
+                stats['txn_reads'] += 1   # this transaction has written
+            elif recently_wrote():
+                stats['ryw_reads'] += 1
+            elif not HEALTHY:
+                stats['fallbacks'] += 1
+            else:
+                stats['replica_reads'] += 1
+                return self._db.engines[HEALTHY[next(_next) % len(HEALTHY)]]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(s):
+    if s.info.pop('wrote', False):
+        wrote()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(s):
+    s.info.pop('wrote', None)
+
+
+# --- lag monitoring
+def check(db, heartbeat):
+    """Beat on the primary, then measure and apply every replica's lag."""
+    now = time.time()
+    with db.engine.begin() as conn:
+        if not conn.execute(update(heartbeat).where(heartbeat.id == 1).values(at=now)).rowcount:
+            conn.execute(heartbeat.__table__.insert().values(id=1, at=now))
+    healthy = []
+    for name in NAMES:
+        try:
+            with db.engines[name].connect() as conn:
+                at = conn.execute(select(heartbeat.at).where(heartbeat.id == 1)).scalar()
+            lag = now - at if at is not None else None
+        except Exception as e:   # down, or not migrated yet
+            print(f"[REPLICA] {name} unreachable: {e.__class__.__name__}")
+            lag = None
+        was_ok = name in HEALTHY
+        ok = lag is not None and lag <= MAX_LAG
+        if ok != was_ok:
+            print(f"[REPLICA] {name} " + (f"back in service (lag {lag:.2f}s)" if ok else
+                  f"out of service (lag {'unknown' if lag is None else f'{lag:.2f}s'}); reads fall back"))
+        LAG[name] = lag
+        if ok:
+            healthy.append(name)
+    HEALTHY[:] = healthy
+    mono = time.monotonic()
+    for user in [u for u, until in RECENT_WRITERS.items() if until < mono]:
+        del RECENT_WRITERS[user]
+
+
+def monitor(app, sleep):
+    from models import db, ReplicaHeartbeat
+    while True:
+        with app.app_context():
+            try:
+                check(db, ReplicaHeartbeat)
+            except Exception as e:   # the primary itself is unreachable
+                print(f"[REPLICA] Heartbeat failed: {e.__class__.__name__}")
+                HEALTHY[:] = []
+        sleep(CHECK_EVERY)
+
+
+def status():
+    return {'replicas': {name: {'lag': None if LAG.get(name) is None else round(LAG[name], 3),
+                                'healthy': name in HEALTHY} for name in NAMES},
+            'max_lag': MAX_LAG, 'ryw_seconds': RYW_SECONDS, 'recent_writers': len(RECENT_WRITERS),
+            **stats}
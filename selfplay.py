@@ -0,0 +1,182 @@
+# selfplay.py
+# Headless Xeri self-play on the server's rules (xeri_rules).
+#
+#   python selfplay.py --games 100000 --players 2 --policy solver,greedy --out selfplay-out
+#
+# Games are split into chunks and played across a multiprocessing pool. Game
+# g is dealt from random.Random(f"{seed}:{g}"), so a run is reproducible for
+# any worker count. Each finished chunk is written as soon as it arrives to
+# <out>/part-NNNNN.npz (numpy, compressed columns) or, without numpy,
+# part-NNNNN.json.gz holding the same columns as lists:
+#   game      game number                    int64  [games]
+#   scores    points per seat                int16  [games, players]
+#   captures  captures per seat              int16  [games, players]
+#   moves     cards played                   int16  [games]
+#   winner    seat with the most points, -1 on a tie   int8 [games]
+# plus meta.json describing the run.
+#
+# A policy picks the index of the card to play: policy(t, rng) -> int, where
+# t is the table dict from xeri_rules. Built in: first, random, greedy (the
+# cpuPlay capture-else-random rule), solver (greedy, then perfect play in the
+# last deal with every hand visible) and mc (xeri_analysis estimates, slow).
+# Anything else is imported as module:function; a policy may also have a
+# reset() attribute, called before every game. --policy is a comma list
+# assigned to seats in order and repeated as needed. Runs are reproducible
+# as long as the policies are (mc is time-capped, so it is not).
+import argparse, gzip, importlib, json, multiprocessing, os, random, sys, time
+
+try:
+    import numpy as np
+except ImportError:  # in requirements.txt; without it, gzipped JSON columns instead
+    np = None
+
+import xeri_rules
+import xeri_solver
+
+
+def first(t, rng):
+    return 0
+
+
+def random_card(t, rng):
+    return rng.randrange(len(t['players'][t['turn_idx']]['hand']))
+
+
+def greedy(t, rng):
+    hand = t['players'][t['turn_idx']]['hand']
+    if t['table']:
+        top = t['table'][-1]['r']
+        for i, c in enumerate(hand):
+            if c['r'] == top:
+                return i
+    return rng.randrange(len(hand))
+
+
+def solver(t, rng):
+    if not xeri_rules.last_deal(t):
+        return greedy(t, rng)
+    return xeri_solver.best_index([p['hand'] for p in t['players']], t['table'], t['turn_idx'])
+
+solver.reset = lambda: xeri_solver.clear()   # ties would otherwise depend on earlier games
+
+
+def mc(t, rng):
+    import xeri_analysis
+    hand = t['players'][t['turn_idx']]['hand']
+    est = xeri_analysis.evaluate(xeri_analysis.position(t), budget=0.005)
+    best = xeri_analysis.best_rank(est)
+    return next(i for i, c in enumerate(hand) if c['r'] == best)
+
+
+POLICIES = {'first': first, 'random': random_card, 'greedy': greedy, 'solver': solver, 'mc': mc}
+
+
+def load_policy(name):
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, func = name.partition(':')
+    if not func:
+        raise SystemExit(f"Unknown policy {name!r} (built in: {', '.join(POLICIES)}; or module:function)")
+    return getattr(importlib.import_module(module), func)
+
+
+def play_game(policies, seed, game):
+    """One round; (scores, captures, moves)."""
+    rng = random.Random(f"{seed}:{game}")
+    for policy in policies:
+        if hasattr(policy, 'reset'):
+            policy.reset()
+    n = len(policies)
+    t = {'players': [{'hand': [], 'score': 0} for _ in range(n)],
+         'table': [], 'deck': None, 'turn_idx': 0, 'out': []}
+    xeri_rules.deal(t, rng)
+    captures = [0] * n
+    moves = 0
+    while True:
+        seat = t['turn_idx']
+        before = t['players'][seat]['score']
+        over = xeri_rules.play(t, policies[seat](t, rng))
+        moves += 1
+        if t['players'][seat]['score'] != before:
+            captures[seat] += 1
+        if over:
+            return [p['score'] for p in t['players']], captures, moves
+
+
+def run_chunk(job):
+    """Play games [start, start + count); returns (chunk, columns, cpu seconds)."""
+    chunk, start, count, seed, names = job
+    policies = [load_policy(name) for name in names]
+    cols = {'game': [], 'scores': [], 'captures': [], 'moves': [], 'winner': []}
+    cpu = time.process_time()
+    for g in range(start, start + count):
+        scores, captures, moves = play_game(policies, seed, g)
+        top = max(scores)
+        cols['game'].append(g)
+        cols['scores'].append(scores)
+        cols['captures'].append(captures)
+        cols['moves'].append(moves)
+        cols['winner'].append(scores.index(top) if scores.count(top) == 1 else -1)
+    return chunk, cols, time.process_time() - cpu
+
+
+DTYPES = {'game': 'int64', 'scores': 'int16', 'captures': 'int16', 'moves': 'int16', 'winner': 'int8'}
+
+
+def write_part(out, chunk, cols):
+    if np is not None:
+        path = os.path.join(out, f"part-{chunk:05d}.npz")
+        np.savez_compressed(path, **{k: np.asarray(v, dtype=DTYPES[k]) for k, v in cols.items()})
+    else:
+        path = os.path.join(out, f"part-{chunk:05d}.json.gz")
+        with gzip.open(path, 'wt') as f:
+            json.dump(cols, f, separators=(',', ':'))
+    return path
+
+
+def main(argv):
+    ap = argparse.ArgumentParser(description="Headless Xeri self-play.")
+    ap.add_argument('--games', type=int, default=10_000)
+    ap.add_argument('--players', type=int, default=2, choices=(2, 3, 4))
+    ap.add_argument('--policy', default='greedy', help="comma list per seat, repeated (default: greedy)")
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    ap.add_argument('--chunk', type=int, default=1_000, help="games per output part")
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--out', default='selfplay-out')
+    args = ap.parse_args(argv)
+    for opt in ('games', 'workers', 'chunk'):
+        if getattr(args, opt) < 1:
+            ap.error(f"--{opt} must be at least 1")
+
+    names = args.policy.split(',')
+    names = [names[i % len(names)] for i in range(args.players)]
+    for name in names:
+        load_policy(name)   # fail before forking
+    os.makedirs(args.out, exist_ok=True)
+    jobs = [(i, start, min(args.chunk, args.games - start), args.seed, names)
+            for i, start in enumerate(range(0, args.games, args.chunk))]
+
+    wins = [0] * args.players
+    cpu = 0.0
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for chunk, cols, chunk_cpu in pool.imap_unordered(run_chunk, jobs):
+            write_part(args.out, chunk, cols)
+            cpu += chunk_cpu
+            for w in cols['winner']:
+                if w >= 0:
+                    wins[w] += 1
+    elapsed = time.perf_counter() - started
+
+    with open(os.path.join(args.out, 'meta.json'), 'w') as f:
+        json.dump({'games': args.games, 'players': args.players, 'policies': names, 'seed': args.seed,
+                   'chunk': args.chunk, 'workers': args.workers, 'format': 'npz' if np else 'json.gz',
+                   'elapsed': round(elapsed, 3), 'cpu': round(cpu, 3)}, f, indent=2)
+    print(f"[SELFPLAY] {args.games} game(s) in {elapsed:.2f}s on {args.workers} worker(s): "
+          f"{args.games / elapsed:,.0f} games/s, {args.games / max(cpu, 1e-9):,.0f} games/s/core")
+    for seat, (name, w) in enumerate(zip(names, wins)):
+        print(f"[SELFPLAY]   seat {seat} {name}: {w / args.games:.1%} wins")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
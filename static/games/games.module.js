@@ -39,14 +39,28 @@ constructor(){ super(); this.attachShadow({mode:'open'}).innerHTML = TPL; this.$
 connectedCallback(){ }
 
 
-init(opts){ this.state.user = opts?.username||'guest'; this.render(); }
+// opts.bootstrap.lobby: { apiPath: data } inlined by the page, served once instead of fetched
+init(opts){ this.state.user = opts?.username||'guest'; this._seed = new Map(Object.entries(opts?.bootstrap?.lobby||{})); this.render(); }
 
 
 navigate(route, params={}){ this.state.route=route; this.state.params=params; this.render(); }
 
 
 // --- API helpers
-async api(path, opts){ const r=await fetch(path, Object.assign({headers:{'Content-Type':'application/json'}}, opts)); return r.json(); }
+// GETs revalidate with the last ETag; a 304 reuses the cached body
+async api(path, opts){
+const get = !opts || !opts.method || opts.method==='GET';
+if(get && this._seed?.has(path)){ const data=this._seed.get(path); this._seed.delete(path); return data; }
+const cached = get && this._etags?.get(path);
+const headers = {'Content-Type':'application/json'};
+if(cached) headers['If-None-Match'] = cached.etag;
+const r=await fetch(path, Object.assign({headers}, opts));
+if(r.status===304 && cached) return cached.data;
+const data = await r.json();
+const etag = r.headers.get('ETag');
+if(get && etag){ (this._etags ||= new Map()).set(path, {etag, data}); }
+return data;
+}
 
 
 // --- SOCKET (lazy)
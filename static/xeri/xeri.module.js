@@ -18,6 +18,13 @@ const playBtn = document.getElementById("playBtn");
 const pop = document.getElementById("xeri-pop");
 const scoreboard = document.getElementById("scoreboard");
 
+// Pre-rendered sprite sheet (build_assets.py --sprite) if the page links one
+const SPRITE = document.querySelector('meta[name="card-sprite"]')?.content;
+function cardHTML(c){
+  if(!SPRITE) return cardSVG({rank:c.rank,suit:c.suit,faceUp:true});
+  return `<svg viewBox="0 0 190 258" aria-label="${c.rank} of ${c.suit}"><use href="${SPRITE}#card-${c.rank}${c.suit}"/></svg>`;
+}
+
 // --- helpers ---
 function makeDeck(){
   const s=["S","H","D","C"], r=["A","2","3","4","5","6","7","8","9","10","J","Q","K"];
@@ -42,7 +49,7 @@ function renderPile(){
     el.className="card";
     el.style.zIndex=1+i;
     el.style.transform=`translate(${i}px,${i}px)`;
-    el.innerHTML=cardSVG({rank:c.rank,suit:c.suit,faceUp:true});
+    el.innerHTML=cardHTML(c);
     pileEl.appendChild(el);
   });
 }
@@ -52,7 +59,7 @@ function renderHand(){
     const el=document.createElement("div");
     el.className="card";
     if(i===state.selected) el.classList.add("selected");
-    el.innerHTML=cardSVG({rank:c.rank,suit:c.suit,faceUp:true});
+    el.innerHTML=cardHTML(c);
     el.addEventListener("click",()=>{
       state.selected=(state.selected===i?-1:i);
       playBtn.disabled=(state.selected<0);
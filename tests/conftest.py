@@ -0,0 +1,4 @@
+# The modules under test live at the repository root.
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
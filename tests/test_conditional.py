@@ -0,0 +1,53 @@
+from flask import Flask
+
+from conditional import Version, conditional
+
+app = Flask(__name__)
+version = Version()
+builds = []
+
+
+@app.route('/data')
+def data():
+    def build():
+        builds.append(version.n)
+        return {'n': version.n}
+    return conditional(version.etag('data'), version.at, build)
+
+
+def test_first_request_gets_body_and_etag():
+    resp = app.test_client().get('/data')
+    assert resp.status_code == 200
+    assert resp.get_json() == {'n': version.n}
+    assert resp.headers['ETag'] == f'W/"{version.etag("data")}"'
+    assert resp.headers['Cache-Control'] == 'no-cache'
+
+
+def test_matching_etag_is_304_without_building():
+    client = app.test_client()
+    etag = client.get('/data').headers['ETag']
+    before = len(builds)
+    resp = client.get('/data', headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert resp.data == b''
+    assert resp.headers['ETag'] == etag
+    assert len(builds) == before
+
+
+def test_mismatched_etag_after_bump_rebuilds():
+    client = app.test_client()
+    etag = client.get('/data').headers['ETag']
+    version.bump()
+    resp = client.get('/data', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.get_json() == {'n': version.n}
+    assert resp.headers['ETag'] != etag
+
+
+def test_if_none_match_wins_over_if_modified_since():
+    client = app.test_client()
+    lm = client.get('/data').headers['Last-Modified']
+    resp = client.get('/data', headers={'If-None-Match': 'W/"stale"', 'If-Modified-Since': lm})
+    assert resp.status_code == 200
+    resp = client.get('/data', headers={'If-Modified-Since': lm})
+    assert resp.status_code == 304
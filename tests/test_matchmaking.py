@@ -0,0 +1,61 @@
+from matchmaking import MatchQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def names(group):
+    return sorted(e.name for e in group) if group else None
+
+
+def test_pairs_nearest_rating_within_window():
+    q = MatchQueue(size=2, base_window=100, clock=Clock())
+    assert q.enqueue('low', 's1', 1000) is None
+    assert q.enqueue('high', 's2', 1500) is None   # 500 apart: outside both windows
+    assert names(q.enqueue('mid', 's3', 1450)) == ['high', 'mid']
+    assert list(q.entries) == ['low']
+
+
+def test_prefers_the_closer_neighbour():
+    q = MatchQueue(size=2, base_window=300, clock=Clock())
+    q.enqueue('below', 's1', 1000)
+    q.enqueue('above', 's2', 1400)
+    assert names(q.enqueue('anchor', 's3', 1150)) == ['anchor', 'below']   # 150 below beats 250 above
+    assert list(q.entries) == ['above']
+
+
+def test_window_widens_with_waiting_time():
+    clock = Clock()
+    q = MatchQueue(size=2, base_window=100, widen_per_sec=20, max_window=800, clock=clock)
+    q.enqueue('a', 's1', 1000)
+    q.enqueue('b', 's2', 1400)
+    assert q.sweep() == []
+    clock.now += 10   # windows now 100 + 200 = 300: still apart
+    assert q.sweep() == []
+    clock.now += 5    # 400: a can reach b
+    assert [names(g) for g in q.sweep()] == [['a', 'b']]
+    assert len(q) == 0
+
+
+def test_window_is_capped():
+    clock = Clock()
+    q = MatchQueue(size=2, base_window=100, widen_per_sec=20, max_window=800, clock=clock)
+    q.enqueue('a', 's1', 1000)
+    q.enqueue('b', 's2', 1900)
+    clock.now += 3600
+    assert q.sweep() == []
+
+
+def test_groups_of_three_and_requeue_and_sid_guard():
+    q = MatchQueue(size=3, base_window=100, clock=Clock())
+    q.enqueue('a', 's1', 1000)
+    q.enqueue('a', 's1b', 1050)   # re-queueing replaces the old entry
+    assert len(q) == 1 and q.entries['a'].sid == 's1b'
+    assert q.dequeue('a', sid='s1') is None   # an old connection can't remove the new entry
+    q.enqueue('b', 's2', 1000)
+    assert names(q.enqueue('c', 's3', 1100)) == ['a', 'b', 'c']
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+import ordered
+from ordered import OrderedIndex
+
+
+@pytest.fixture
+def small_load(monkeypatch):
+    # tiny sublists, so a few hundred keys exercise every split and drop
+    monkeypatch.setattr(ordered, 'LOAD', 4)
+
+
+def check(index, model):
+    model = sorted(model)
+    assert list(index) == model
+    assert len(index) == len(model)
+    for i, key in enumerate(model):
+        assert index[i] == key
+        assert index.rank(key) == model.index(key)
+        assert key in index
+
+
+def test_interleaved_add_and_remove_keep_order(small_load):
+    rng = random.Random(7)
+    index, model = OrderedIndex(), []
+    for step in range(3000):
+        if model and rng.random() < 0.45:
+            key = rng.choice(model)
+            model.remove(key)
+            assert index.remove(key)
+        else:
+            key = (rng.randrange(200), step)
+            model.append(key)
+            index.add(key)
+        if step % 100 == 0:
+            check(index, model)
+    check(index, model)
+    while model:   # drain to empty, dropping every sublist
+        key = model.pop(rng.randrange(len(model)))
+        assert index.remove(key)
+    check(index, model)
+
+
+def test_missing_keys(small_load):
+    index = OrderedIndex(range(0, 100, 2))
+    assert not index.remove(3)
+    assert not index.remove(1000)
+    assert 3 not in index and 1000 not in index
+    assert index.rank(3) == 2
+    assert index.rank(1000) == 50
+    assert index.rank(-1) == 0
+
+
+def test_slice_and_irange(small_load):
+    keys = list(range(0, 100, 3))
+    index = OrderedIndex(reversed(keys))
+    assert index.slice(5, 17) == keys[5:17]
+    assert index.slice(-3, 4) == keys[:4]
+    assert index.slice(30, 99) == keys[30:]
+    assert index.slice(8, 8) == []
+    assert index.irange(10, 40) == [k for k in keys if 10 <= k <= 40]
+    assert index.irange(200, 300) == []
+    assert index[-1] == keys[-1]
+    with pytest.raises(IndexError):
+        index[len(keys)]
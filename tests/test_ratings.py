@@ -0,0 +1,35 @@
+import pytest
+
+from ratings import Leaderboard, elo_update
+
+
+def test_elo_two_players_is_zero_sum():
+    out = elo_update({'a': 1200, 'b': 1200}, {'a': 10, 'b': 3})
+    assert out['a'] == pytest.approx(1216)
+    assert out['a'] + out['b'] == pytest.approx(2400)
+
+
+def test_elo_upset_moves_more():
+    fav = elo_update({'a': 1600, 'b': 1200}, {'a': 10, 'b': 3})
+    upset = elo_update({'a': 1600, 'b': 1200}, {'a': 3, 'b': 10})
+    assert fav['a'] - 1600 < 1600 - upset['a']
+
+
+def test_leaderboard_ranks_follow_updates():
+    lb = Leaderboard([('a', 1300), ('b', 1200), ('c', 1100)])
+    assert [lb.rank(n) for n in 'abc'] == [1, 2, 3]
+    lb.set('c', 1400)            # re-rank: remove the old key, add the new one
+    assert [lb.rank(n) for n in 'cab'] == [1, 2, 3]
+    lb.set('d', 1250)
+    assert [r['name'] for r in lb.top(10)] == ['c', 'a', 'd', 'b']
+    assert lb.rank('nobody') is None
+    assert lb.rating('nobody') == 1200
+
+
+def test_leaderboard_ties_break_by_name_and_around():
+    lb = Leaderboard([(f"p{i:03d}", 1000 + (i // 2) * 10) for i in range(100)])
+    assert lb.rank('p098') == 1 and lb.rank('p099') == 2   # equal rating: name order
+    rank, rows = lb.around('p050', 2)
+    assert rank == 49   # 48 players rated above 1250
+    assert [r['rank'] for r in rows] == [47, 48, 49, 50, 51]
+    assert rows[2]['name'] == 'p050'
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+from flask import Flask
+
+import replicas
+from models import db, ReplicaHeartbeat, User
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'primary.db'}"
+    replicas.configure(app, [f"sqlite:///{tmp_path / 'replica.db'}"])
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines['replica0'])
+        # the same username on both sides, with a password that says where it was read
+        db.session.add(User(username='ann', password='primary'))
+        db.session.commit()
+        with db.engines['replica0'].begin() as conn:
+            conn.execute(User.__table__.insert().values(username='ann', password='replica'))
+        yield app
+        db.session.remove()
+    replicas.NAMES[:] = []
+    replicas.HEALTHY[:] = []
+
+
+def read_ann():
+    db.session.remove()
+    return db.session.execute(db.select(User.password).filter_by(username='ann')).scalar()
+
+
+def replica_heartbeat(at):
+    with db.engines['replica0'].begin() as conn:
+        conn.execute(ReplicaHeartbeat.__table__.delete())
+        conn.execute(ReplicaHeartbeat.__table__.insert().values(id=1, at=at))
+
+
+def test_replica_without_heartbeat_takes_no_reads(app):
+    replicas.check(db, ReplicaHeartbeat)
+    assert replicas.HEALTHY == []
+    assert replicas.LAG['replica0'] is None
+    assert read_ann() == 'primary'
+
+
+def test_fresh_replica_serves_reads(app):
+    replica_heartbeat(time.time())
+    replicas.check(db, ReplicaHeartbeat)
+    assert replicas.HEALTHY == ['replica0']
+    assert read_ann() == 'replica'
+
+
+def test_stale_replica_falls_back_to_primary(app, monkeypatch):
+    monkeypatch.setattr(replicas, 'MAX_LAG', 2)
+    replica_heartbeat(time.time())
+    replicas.check(db, ReplicaHeartbeat)
+    assert read_ann() == 'replica'
+    replica_heartbeat(time.time() - 10)   # replication stalled 10s ago
+    before = replicas.stats['fallbacks']
+    replicas.check(db, ReplicaHeartbeat)
+    assert replicas.HEALTHY == []
+    assert replicas.LAG['replica0'] > 2
+    assert read_ann() == 'primary'
+    assert replicas.stats['fallbacks'] == before + 1
+    replica_heartbeat(time.time())      # caught up again
+    replicas.check(db, ReplicaHeartbeat)
+    assert read_ann() == 'replica'
+
+
+def test_reads_after_a_write_stay_on_the_primary(app):
+    replica_heartbeat(time.time())
+    replicas.check(db, ReplicaHeartbeat)
+    db.session.remove()
+    db.session.add(User(username='bob', password='x'))
+    db.session.flush()
+    assert db.session.execute(db.select(User.password).filter_by(username='ann')).scalar() == 'primary'
+    db.session.rollback()
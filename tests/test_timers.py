@@ -0,0 +1,62 @@
+from timers import DeadlineHeap, RateCounter
+
+
+def test_pop_due_in_deadline_order():
+    h = DeadlineHeap()
+    h.set('c', 30)
+    h.set('a', 10)
+    h.set('b', 20)
+    assert h.next_deadline() == 10
+    assert h.pop_due(25) == ['a', 'b']
+    assert h.pop_due(100) == ['c']
+    assert len(h) == 0
+
+
+def test_cancel_drops_the_key():
+    h = DeadlineHeap()
+    h.set('a', 10)
+    h.set('b', 20)
+    h.cancel('a')
+    assert 'a' not in h
+    assert h.pop_due(100) == ['b']
+
+
+def test_rearm_later_fires_at_the_new_deadline():
+    h = DeadlineHeap()
+    h.set('a', 10)
+    h.set('b', 15)
+    h.set('a', 20)   # pushed back: the stale entry is re-queued lazily
+    assert h.pop_due(12) == []
+    assert h.pop_due(16) == ['b']
+    assert h.pop_due(20) == ['a']
+
+
+def test_rearm_earlier_fires_once():
+    h = DeadlineHeap()
+    h.set('a', 20)
+    h.set('a', 5)
+    assert h.next_deadline() == 5
+    assert h.pop_due(6) == ['a']
+    assert h.pop_due(100) == []
+
+
+def test_cancel_then_rearm():
+    h = DeadlineHeap()
+    h.set('a', 10)
+    h.cancel('a')
+    h.set('a', 30)
+    assert h.pop_due(10) == []
+    assert h.get('a') == 30
+    assert h.pop_due(30) == ['a']
+
+
+def test_rate_counter_window():
+    now = [100.0]
+    r = RateCounter(window=10, clock=lambda: now[0])
+    r.hit(5)
+    now[0] += 3
+    r.hit(5)
+    assert r.total == 10
+    assert r.rate() == 1.0
+    now[0] += 8   # the first bucket slides out
+    assert r.rate() == 0.5
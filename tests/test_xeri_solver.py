@@ -0,0 +1,76 @@
+import copy, random
+from collections import deque
+
+import pytest
+
+import xeri_rules
+import xeri_solver
+
+
+def table(hands, pile, turn=0):
+    return {'players': [{'hand': list(h), 'score': 0} for h in hands], 'table': list(pile),
+            'deck': deque(), 'out': [], 'turn_idx': turn}
+
+
+def brute(t, me):
+    """Paranoid minimax over xeri_rules.play: me's points minus everyone else's."""
+    cur = t['turn_idx']
+    if not t['players'][cur]['hand']:
+        return 0
+    values = []
+    for i in range(len(t['players'][cur]['hand'])):
+        child = copy.deepcopy(t)
+        before = child['players'][cur]['score']
+        over = xeri_rules.play(child, i)
+        gained = child['players'][cur]['score'] - before
+        v = (gained if cur == me else -gained) + (0 if over else brute(child, me))
+        values.append(v)
+    return max(values) if cur == me else min(values)
+
+
+def random_position(rng, n, k):
+    deck = [{'r': r, 's': s} for r in (2, 3, 4) for s in xeri_rules.SUITS]
+    rng.shuffle(deck)
+    turn = rng.randrange(n)
+    # the seats from `turn` on hold k cards, the rest k - 1, as dealt
+    cut = rng.randrange(1, n + 1)
+    sizes = [k if (s - turn) % n < cut else k - 1 for s in range(n)]
+    hands, pos = [], 0
+    for size in sizes:
+        hands.append(deck[pos:pos + size])
+        pos += size
+    return hands, deck[pos:pos + rng.randrange(4)], turn
+
+
+@pytest.mark.parametrize('n,k', [(2, 3), (2, 4), (3, 2)])
+def test_matches_brute_force(n, k):
+    rng = random.Random(n * 10 + k)
+    for _ in range(40):
+        hands, pile, turn = random_position(rng, n, k)
+        xeri_solver.clear()
+        value, rank = xeri_solver.solve(hands, pile, turn)
+        assert value == brute(table(hands, pile, turn), turn)
+        # and the card it picks actually achieves that value
+        t = table(hands, pile, turn)
+        idx = xeri_solver.best_index(hands, pile, turn)
+        assert hands[turn][idx]['r'] == rank
+        over = xeri_rules.play(t, idx)
+        gained = t['players'][turn]['score']
+        assert gained + (0 if over else brute(t, turn)) == value
+
+
+def test_warm_table_gives_the_same_answers():
+    rng = random.Random(5)
+    positions = [random_position(rng, 2, 4) for _ in range(20)]
+    xeri_solver.clear()
+    cold = [xeri_solver.solve(*p)[0] for p in positions]
+    warm = [xeri_solver.solve(*p)[0] for p in positions]
+    assert cold == warm
+
+
+def test_rejects_unreachable_hand_sizes():
+    c = {'r': 2, 's': 'S'}
+    with pytest.raises(ValueError):
+        xeri_solver.solve([[c], [c, c, c]], [], 0)
+    with pytest.raises(ValueError):
+        xeri_solver.solve([[], []], [], 0)
@@ -0,0 +1,86 @@
+# timers.py
+# One heap for many deadlines. Pushing a deadline back (the common case: a
+# user typed again, a player moved) is a dict write; the stale heap entry is
+# re-queued lazily when it reaches the top.
+import heapq, itertools, time
+from collections import deque
+
+
+class DeadlineHeap:
+    def __init__(self):
+        self._heap = []      # [(deadline, seq, key)]
+        self._due = {}       # { key: current deadline }
+        self._entry = {}     # { key: (seq, deadline) of its live heap entry }
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def _push(self, key, deadline):
+        seq = next(self._seq)
+        self._entry[key] = (seq, deadline)
+        heapq.heappush(self._heap, (deadline, seq, key))
+
+    def set(self, key, deadline):
+        self._due[key] = deadline
+        queued = self._entry.get(key)
+        if queued is None or deadline < queued[1]:
+            self._push(key, deadline)
+
+    def cancel(self, key):
+        self._due.pop(key, None)
+
+    def get(self, key):
+        return self._due.get(key)
+
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return every key whose deadline is <= now."""
+        fired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, seq, key = heapq.heappop(heap)
+            if self._entry.get(key, (None,))[0] != seq:
+                continue                      # superseded by an earlier push
+            del self._entry[key]
+            due = self._due.get(key)
+            if due is None:
+                continue                      # cancelled
+            if due > now:
+                self._push(key, due)          # pushed back since it was queued
+                continue
+            del self._due[key]
+            fired.append(key)
+        return fired
+
+
+class RateCounter:
+    """Events per second over a sliding window of one-second buckets."""
+
+    def __init__(self, window=60, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.buckets = deque()   # [[second, count]]
+        self.total = 0
+
+    def _trim(self, sec):
+        while self.buckets and self.buckets[0][0] <= sec - self.window:
+            self.buckets.popleft()
+
+    def hit(self, n=1):
+        sec = int(self.clock())
+        if self.buckets and self.buckets[-1][0] == sec:
+            self.buckets[-1][1] += n
+        else:
+            self.buckets.append([sec, n])
+        self.total += n
+        self._trim(sec)
+
+    def rate(self):
+        self._trim(int(self.clock()))
+        return sum(c for _, c in self.buckets) / self.window
@@ -0,0 +1,322 @@
+# tracing.py
+# Local request tracing with no collector or network needed.
+#
+# Every Flask request and Socket.IO event is a root span (events through
+# wrap_handlers, which wraps handlers as they are registered); SQLAlchemy
+# statements, commits and Socket.IO emits made while it runs are child
+# spans, and print() lines become span events. Lines printed inside a span
+# start with [<trace id>:<span id>], so server logs can be matched to traces.
+#
+# Spans stay buffered until their root ends. Then the trace is tail-sampled:
+# it is kept if it took TRACE_SLOW_MS or more, or raised, or otherwise with
+# probability TRACE_SAMPLE. Kept traces are encoded as OTLP/JSON, one
+# ExportTraceServiceRequest per line, the format the OpenTelemetry
+# collector's otlpjsonfile receiver and Jaeger's importer read. They are
+# appended to TRACE_FILE and/or kept in memory for /admin/traces.
+#
+#   TRACING=file,memory   which exporters to enable (unset: tracing is off)
+#   TRACE_FILE            default traces.otlp.jsonl
+#   TRACE_SLOW_MS         default 200
+#   TRACE_SAMPLE          fraction of fast traces kept, default 0.01
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import contextvars, inspect, json, os, random, sys, threading, time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+EXPORT = {e.strip() for e in os.environ.get("TRACING", "").split(',') if e.strip()}
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.otlp.jsonl")
+SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", 200))
+SAMPLE = float(os.environ.get("TRACE_SAMPLE", 0.01))
+SERVICE = os.environ.get("OTEL_SERVICE_NAME", "chat")
+KEEP = 200             # traces held by the in-memory collector
+MAX_SPANS = 512        # per trace; further children are counted but not recorded
+MAX_STATEMENT = 512    # characters of SQL kept on a db span
+
+# OTLP SpanKind / StatusCode
+INTERNAL, SERVER, CLIENT, PRODUCER = 1, 2, 3, 4
+STATUS_ERROR = 2
+
+_current = contextvars.ContextVar('span', default=None)
+_lock = threading.Lock()
+collected = deque(maxlen=KEEP)   # kept traces, oldest first (OTLP dicts)
+stats = {'traces': 0, 'kept': 0, 'slow': 0, 'errors': 0, 'spans_dropped': 0}
+
+
+class Trace:
+    __slots__ = ('trace_id', 'spans', 'error')
+
+    def __init__(self):
+        self.trace_id = '%032x' % random.getrandbits(128)
+        self.spans = []
+        self.error = False
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attrs', 'events', 'error')
+
+    def __init__(self, trace, parent_id, name, kind, attrs):
+        self.trace = trace
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.events = []
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+
+def current():
+    return _current.get()
+
+
+def start(name, kind=INTERNAL, root=True, **attrs):
+    """Open a span under the current one (a new trace if there is none and `root`).
+    Returns (span, token) for finish(), or (None, None) if nothing was started."""
+    parent = _current.get()
+    if parent is None:
+        if not root or not EXPORT:
+            return None, None
+        trace = Trace()
+        stats['traces'] += 1
+    else:
+        trace = parent.trace
+        if len(trace.spans) >= MAX_SPANS:
+            stats['spans_dropped'] += 1
+            return None, None
+    s = Span(trace, parent.span_id if parent else None, name, kind, attrs)
+    trace.spans.append(s)
+    return s, _current.set(s)
+
+
+def finish(s, token, error=None):
+    if s is None:
+        return
+    s.end = time.time_ns()
+    if error is not None:
+        s.error = f"{type(error).__name__}: {error}"
+        s.trace.error = True
+    _current.reset(token)
+    if s.parent_id is None:
+        _sample(s)
+
+
+@contextmanager
+def span(name, kind=INTERNAL, root=True, **attrs):
+    s, token = start(name, kind, root, **attrs)
+    try:
+        yield s
+    except BaseException as e:
+        finish(s, token, e)
+        raise
+    else:
+        finish(s, token)
+
+
+# --- tail sampling & export
+def _sample(root):
+    trace = root.trace
+    ms = (root.end - root.start) / 1e6
+    slow = ms >= SLOW_MS
+    if not (slow or trace.error or random.random() < SAMPLE):
+        return
+    stats['kept'] += 1
+    stats['slow'] += slow
+    stats['errors'] += trace.error
+    doc = otlp(trace)
+    if 'memory' in EXPORT:
+        collected.append(doc)
+    if 'file' in EXPORT:
+        line = json.dumps(doc, separators=(',', ':')) + '\n'
+        with _lock, open(TRACE_FILE, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def _value(v):
+    if isinstance(v, bool):
+        return {'boolValue': v}
+    if isinstance(v, int):
+        return {'intValue': str(v)}
+    if isinstance(v, float):
+        return {'doubleValue': v}
+    return {'stringValue': str(v)}
+
+
+def _attrs(d):
+    return [{'key': k, 'value': _value(v)} for k, v in d.items() if v is not None]
+
+
+def otlp(trace):
+    """One trace as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in trace.spans:
+        out = {'traceId': trace.trace_id, 'spanId': s.span_id, 'parentSpanId': s.parent_id or '',
+               'name': s.name, 'kind': s.kind,
+               'startTimeUnixNano': str(s.start), 'endTimeUnixNano': str(s.end or s.start),
+               'attributes': _attrs(s.attrs),
+               'events': [{'timeUnixNano': str(at), 'name': name, 'attributes': _attrs(a)}
+                          for at, name, a in s.events]}
+        if s.error:
+            out['status'] = {'code': STATUS_ERROR, 'message': s.error}
+        spans.append(out)
+    return {'resourceSpans': [{
+        'resource': {'attributes': _attrs({'service.name': SERVICE})},
+        'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': spans}],
+    }]}
+
+
+# --- log lines
+class _TracedStream:
+    """Wraps stdout: lines written inside a span get its ids and are recorded as span events."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.at_line_start = True
+
+    def write(self, text):
+        s = _current.get()
+        if s is not None and text.strip():
+            s.events.append((time.time_ns(), 'log', {'message': text.rstrip('\n')}))
+            if self.at_line_start:
+                text = f"[{s.trace.trace_id}:{s.span_id}] {text}"
+        if text:
+            self.at_line_start = text.endswith('\n')
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+# --- instrumentation
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is None:
+        return
+    s, token = start('db.query', CLIENT, root=False, **{
+        'db.system': conn.dialect.name, 'db.statement': statement[:MAX_STATEMENT]})
+    if s is not None:
+        context._trace_span = (s, token)
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    pending = getattr(context, '_trace_span', None)
+    if pending:
+        del context._trace_span
+        s, token = pending
+        if cursor is not None and cursor.rowcount is not None and cursor.rowcount >= 0:
+            s.set('db.rows', cursor.rowcount)
+        finish(s, token)
+
+
+def _db_error(exception_context):
+    pending = getattr(exception_context.execution_context, '_trace_span', None)
+    if pending:
+        del exception_context.execution_context._trace_span
+        finish(*pending, exception_context.original_exception)
+
+
+def _before_commit(session):
+    if _current.get() is not None:
+        session.info['_trace_commit'] = start('db.commit', CLIENT, root=False)
+
+
+def _after_commit(session):
+    pending = session.info.pop('_trace_commit', None)
+    if pending:
+        finish(*pending)
+
+
+def _after_rollback(session):
+    pending = session.info.pop('_trace_commit', None)
+    if pending:
+        finish(*pending, RuntimeError("rolled back"))
+
+
+def _traced_handler(handler, message, namespace):
+    from flask import request, session
+
+    # Flask-SocketIO calls connect handlers with `auth` and retries without it on
+    # TypeError; decide once here so the wrapper never raises that TypeError itself
+    takes_auth = message != 'connect' or bool(inspect.signature(handler).parameters)
+
+    @wraps(handler)
+    def traced(*args):
+        with span(f"socket {namespace} {message}", SERVER, **{
+                'socketio.event': message, 'socketio.namespace': namespace,
+                'socketio.sid': request.sid, 'user': session.get('username')}):
+            return handler(*args) if takes_auth else handler()
+    return traced
+
+
+def wrap_handlers(socketio):
+    """Make every handler registered through socketio.on (and so on_event and event) a root
+    span. Call it right after creating the SocketIO object, before any handler is registered.
+    No-op unless TRACING is set."""
+    if not EXPORT:
+        return
+    on = socketio.on
+
+    def traced_on(message, namespace=None):
+        register = on(message, namespace)
+
+        def decorator(handler):
+            register(_traced_handler(handler, message, namespace or '/'))
+            return handler
+        return decorator
+    socketio.on = traced_on
+
+
+def init_app(app, socketio):
+    """Instrument Flask requests, Socket.IO emits and SQLAlchemy (handlers: wrap_handlers). No-op unless TRACING is set."""
+    if not EXPORT:
+        return
+    from flask import g, request, session
+
+    @app.before_request
+    def _trace_request():
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g._trace = start(f"{request.method} {rule}", SERVER, **{
+            'http.method': request.method, 'http.route': rule, 'http.target': request.full_path})
+
+    @app.after_request
+    def _trace_response(response):
+        s = g.get('_trace', (None,))[0]
+        if s is not None:
+            s.set('http.status_code', response.status_code)
+            s.set('user', session.get('username'))
+            response.headers['X-Trace-Id'] = s.trace.trace_id
+        return response
+
+    @app.teardown_request
+    def _trace_teardown(exc):
+        pending = g.pop('_trace', None)
+        if pending:
+            finish(*pending, exc)
+
+    emit = socketio.emit
+
+    def traced_emit(event_name, *args, **kwargs):
+        room = kwargs.get('to') or kwargs.get('room')
+        with span(f"emit {event_name}", PRODUCER, root=False, **{
+                'socketio.event': event_name, 'socketio.namespace': kwargs.get('namespace') or '/',
+                'socketio.room': room if room is not None else ('broadcast' if kwargs.get('broadcast') else None)}):
+            return emit(event_name, *args, **kwargs)
+    socketio.emit = traced_emit
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor)
+    event.listen(Engine, 'handle_error', _db_error)
+    event.listen(Session, 'before_commit', _before_commit)   # the flush's statements are its children
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_soft_rollback', lambda session, previous: _after_rollback(session))
+
+    if not isinstance(sys.stdout, _TracedStream):
+        sys.stdout = _TracedStream(sys.stdout)
+    print(f"[TRACING] exporting to {', '.join(sorted(EXPORT))}; slow >= {SLOW_MS:g}ms, sample {SAMPLE:g}")
@@ -0,0 +1,148 @@
+# xeri_analysis.py
+# Monte-Carlo move estimates for Xeri, from one player's point of view.
+#
+# A position is what the player on turn can see: their hand, the pile, the
+# cards already captured and how many cards everyone else and the deck hold.
+# evaluate() deals the unseen cards at random, plays each legal card and
+# finishes the round with the same capture-else-random policy as cpuPlay in
+# xeri.module.js, in batches until a time cap. Every card is scored on the
+# same deals, so differences between cards are not sampling noise between
+# deals. Suits never matter to the rules (xeri_rules.play), so cards are
+# ranks here and equal ranks are one move. Results are cached per position;
+# asking again is a dict lookup.
+from collections import OrderedDict
+import os, random, time
+
+from xeri_rules import HAND, RANKS
+
+HINT_BUDGET = float(os.environ.get("XERI_HINT_MS", 60)) / 1000       # seconds per hint
+ANALYSIS_BUDGET = float(os.environ.get("XERI_ANALYSIS_MS", 25)) / 1000  # seconds per analysed move
+BATCH = 16            # deals sampled between time checks
+MAX_SAMPLES = 2_000
+CACHE_SIZE = 4_096
+
+FULL = [r for r in RANKS for _ in range(4)]
+
+_cache = OrderedDict()   # { position: estimate }, least recently used first
+stats = {'hits': 0, 'misses': 0, 'samples': 0}
+
+
+def position(t):
+    """The player on turn's view of table `t`, as a hashable key."""
+    n = len(t['players'])
+    turn = t['turn_idx']
+    hand = tuple(sorted(c['r'] for c in t['players'][turn]['hand']))
+    seen = [c['r'] for c in t['table']] + [c['r'] for c in t['out']] + list(hand)
+    unseen = FULL[:]
+    for r in seen:
+        unseen.remove(r)
+    sizes = tuple(len(t['players'][(turn + i) % n]['hand']) for i in range(1, n))
+    top = t['table'][-1]['r'] if t['table'] else 0
+    return (hand, top, len(t['table']), tuple(sorted(unseen)), sizes, len(t['deck']))
+
+
+def _rollout(hands, top, pile, deck, turn, rng):
+    """Finish the round with capture-else-random play; points per seat."""
+    n = len(hands)
+    points = [0] * n
+    while True:
+        hand = hands[turn]
+        if not hand:
+            if any(hands):
+                turn = (turn + 1) % n
+                continue
+            if len(deck) < HAND * n:
+                return points
+            for h in hands:
+                h.extend(deck[-HAND:])
+                del deck[-HAND:]
+            continue
+        if pile and top in hand:
+            hand.remove(top)
+            points[turn] += pile + 1
+            top, pile = 0, 0
+        else:
+            top = hand.pop(rng.randrange(len(hand)))
+            pile += 1
+        turn = (turn + 1) % n
+
+
+def evaluate(pos, budget=HINT_BUDGET, sleep=None):
+    """{ rank: {'ev', 'points'} } for each distinct card in hand, plus 'samples'.
+
+    ev is the expected (own points - average opponent points) over the rest
+    of the round after playing that rank; points is own points alone.
+    `sleep` (e.g. socketio.sleep) is called between batches to yield.
+    """
+    cached = _cache.get(pos)
+    if cached is not None:
+        _cache.move_to_end(pos)
+        stats['hits'] += 1
+        return cached
+    stats['misses'] += 1
+
+    hand, top, pile, unseen, sizes, deck_len = pos
+    n = len(sizes) + 1
+    moves = sorted(set(hand))
+    margin = {r: 0 for r in moves}
+    own = {r: 0 for r in moves}
+    rng = random.Random(hash(pos))
+    pool = list(unseen)
+    samples = 0
+    started = time.perf_counter()
+    while samples < MAX_SAMPLES:
+        for _ in range(BATCH):
+            rng.shuffle(pool)
+            others, i = [], 0
+            for size in sizes:
+                others.append(pool[i:i + size])
+                i += size
+            deck = pool[i:i + deck_len]
+            for r in moves:
+                mine = list(hand)
+                mine.remove(r)
+                if pile and r == top:
+                    gain, t2, p2 = pile + 1, 0, 0
+                else:
+                    gain, t2, p2 = 0, r, pile + 1
+                pts = _rollout([mine] + [list(h) for h in others], t2, p2, list(deck), 1 % n, rng)
+                pts[0] += gain
+                own[r] += pts[0]
+                margin[r] += pts[0] - sum(pts[1:]) / (n - 1)
+            samples += 1
+        if time.perf_counter() - started >= budget:
+            break
+        if sleep:
+            sleep(0)
+    stats['samples'] += samples
+
+    out = {r: {'ev': round(margin[r] / samples, 2), 'points': round(own[r] / samples, 2)} for r in moves}
+    out['samples'] = samples
+    _cache[pos] = out
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return out
+
+
+def best_rank(estimate):
+    return max((r for r in estimate if r != 'samples'), key=lambda r: estimate[r]['ev'])
+
+
+def analyse(log, budget=ANALYSIS_BUDGET, sleep=None):
+    """Per-move review of a finished round from its move log.
+
+    Each entry of `log` is {'seat', 'name', 'pos', 'card'}. Returns one row per
+    move with the best card and how much expected margin the played card gave
+    up, plus each player's total.
+    """
+    moves, lost = [], {}
+    for entry in log:
+        est = evaluate(entry['pos'], budget, sleep)
+        best = best_rank(est)
+        played = entry['card']['r']
+        loss = round(est[best]['ev'] - est[played]['ev'], 2)
+        lost[entry['name']] = round(lost.get(entry['name'], 0) + loss, 2)
+        moves.append({'seat': entry['seat'], 'name': entry['name'], 'played': entry['card'],
+                      'best': best, 'loss': loss, 'samples': est['samples'],
+                      'ev': {str(r): v['ev'] for r, v in est.items() if r != 'samples'}})
+    return {'moves': moves, 'lost': lost}
@@ -0,0 +1,64 @@
+# xeri_rules.py
+# The Xeri rules the server plays by, with no sockets, timers or DB: the
+# games table dict in and out. games_service.play_card wraps these for live
+# tables; selfplay.py runs them headless.
+#   t['players'][i]: {'hand': [...], 'score': int}   cards are {'r': 2..14, 's': suit}
+#   t['table'], t['deck'] (deque), t['turn_idx'], t['out'] (captured cards)
+from collections import deque
+import random
+
+SUITS = ['S', 'H', 'D', 'C']
+RANKS = list(range(2, 15))
+HAND = 6        # cards dealt to each player per deal
+TABLE = 4       # cards face up at the start
+
+
+def new_deck(rng=random):
+    deck = [{'r': r, 's': s} for s in SUITS for r in RANKS]
+    rng.shuffle(deck)
+    return deque(deck)
+
+
+def deal(t, rng=random):
+    """Start a round: fresh deck, the table cards and a hand for everyone."""
+    t['deck'] = new_deck(rng)
+    t['out'] = []
+    t['turn_idx'] = 0
+    t['table'] = [t['deck'].popleft() for _ in range(TABLE)]
+    for pl in t['players']:
+        pl['score'] = 0
+        pl['hand'] = [t['deck'].popleft() for _ in range(HAND)]
+
+
+def last_deal(t):
+    """The deck can't refill the hands again, so every card still in play is known."""
+    return len(t['deck']) < HAND * len(t['players'])
+
+
+def play(t, idx):
+    """Player on turn plays hand[idx]. Captures on a rank match (pile + 1 points),
+    redeals when every hand is empty, and passes the turn. True when the round is over."""
+    cur = t['players'][t['turn_idx']]
+    card = cur['hand'].pop(idx)
+    if t['table'] and card['r'] == t['table'][-1]['r']:
+        cur['score'] += len(t['table']) + 1
+        t['out'].extend(t['table']); t['out'].append(card)
+        t['table'] = []
+    else:
+        t['table'].append(card)
+    return _next_turn(t)
+
+
+def skip(t):
+    """Player on turn has no cards (seated mid-round): pass the turn. True when the round is over."""
+    return _next_turn(t)
+
+
+def _next_turn(t):
+    if all(len(p['hand']) == 0 for p in t['players']):
+        if last_deal(t):
+            return True
+        for pl in t['players']:
+            pl['hand'] = [t['deck'].popleft() for _ in range(HAND)]
+    t['turn_idx'] = (t['turn_idx'] + 1) % len(t['players'])
+    return False
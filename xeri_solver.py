@@ -0,0 +1,201 @@
+# xeri_solver.py
+# Exact solver for the last deal of Xeri, once the deck can no longer refill
+# the hands and every remaining card is known.
+#
+# Under xeri_rules.play a capture is a rank match, so neither suits
+# nor which rank is which matter - only how many of each rank every seat
+# holds. Each rank is packed into a profile int (3 bits of count per seat); a
+# position is the sorted tuple of profiles plus the top card's profile, the
+# pile size and the seat to move. Ranks with the same profile are one move,
+# and equivalent deals share transposition entries. Only the next seat can
+# capture a card, so a rank no two neighbouring seats hold is dead: it is
+# stored as one single per card and the search stops once nothing is live.
+#
+# The value is the root player's points minus everyone else's, with the
+# opponents minimising together (paranoid), which is exact for 2 players. It
+# is found by bisecting with null-window alpha-beta searches. Entries are
+# kept per position with one (lower, upper) bound pair per pile size; a pile
+# d cards different moves the value by at most d, so neighbouring sizes bound
+# each other. The table persists across calls, so a bot asking again on each
+# of its turns re-uses the earlier search.
+
+BITS = 3
+MASK = (1 << BITS) - 1
+TT_MAX = 200_000          # positions kept before the table is dropped
+
+_UNKNOWN = (-(1 << 10), 1 << 10, None)
+_tt = {}                  # { (n, me, turn, groups, top): { pile: (lower, upper, best profile) } }
+_split = {}               # { (n, profile): how the profile is stored }
+stats = {'nodes': 0, 'tt_hits': 0}
+
+
+def _canon(n, p):
+    """(p,) for a live rank, else one dead single per card."""
+    key = (n, p)
+    out = _split.get(key)
+    if out is None:
+        counts = [p >> (BITS * s) & MASK for s in range(n)]
+        if any(counts[s] and counts[(s + 1) % n] for s in range(n)):
+            out = (p,)
+        else:
+            out = tuple(1 << (BITS * s) for s in range(n) for _ in range(counts[s]))
+        _split[key] = out
+    return out
+
+
+def profiles(hands):
+    """{ rank: profile } for every rank someone holds."""
+    out = {}
+    for seat, hand in enumerate(hands):
+        for c in hand:
+            out[c['r']] = out.get(c['r'], 0) + (1 << (BITS * seat))
+    return out
+
+
+def _search(n, me, turn, groups, top, pile, alpha, beta, root=False):
+    stats['nodes'] += 1
+    if not groups and not top:
+        return 0, None
+    sh = BITS * turn
+    if top and not top >> sh & MASK:
+        # only the player to move could capture the top card, and they can't:
+        # once they play it is an ordinary rank again
+        groups, top = tuple(sorted(groups + _canon(n, top))), 0
+    if not top and not any(p & (p - 1) for p in groups):
+        return 0, None   # only dead singles left: nobody can capture anything any more
+
+    key = (n, me, turn, groups, top)
+    known = _tt.get(key)
+    if known is None:
+        known = _tt[key] = {}
+        lo, hi, best_move = _UNKNOWN
+    else:
+        lo, hi, best_move = known.get(pile, _UNKNOWN)
+        if lo != hi:
+            # a pile d cards bigger or smaller moves the value by at most d
+            for q, (qlo, qhi, qmove) in known.items():
+                d = abs(q - pile)
+                if qlo - d > lo:
+                    lo = qlo - d
+                if qhi + d < hi:
+                    hi = qhi + d
+                if best_move is None:
+                    best_move = qmove
+    if not root:   # the root's move has to come from its own children
+        if lo >= beta or lo == hi:
+            stats['tt_hits'] += 1
+            return lo, best_move
+        if hi <= alpha:
+            stats['tt_hits'] += 1
+            return hi, best_move
+        alpha, beta = max(alpha, lo), min(beta, hi)
+
+    nxt = (turn + 1) % n
+    nsh = BITS * nxt
+    # only the next seat can capture what is played now: keep it from an
+    # opponent, feed it to a partner (the opponents are one side)
+    if me != turn and me != nxt:
+        moves = sorted({p for p in groups if p >> sh & MASK}, key=lambda p: -(p >> nsh & MASK))
+    else:
+        moves = sorted({p for p in groups if p >> sh & MASK}, key=lambda p: p >> nsh & MASK)
+    if pile and top >> sh & MASK:
+        moves.insert(0, -1)   # capture the pile
+    if best_move in moves:
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+
+    unit = 1 << sh
+    a0, b0 = alpha, beta
+    maximizing = me == turn
+    best = _UNKNOWN[0] if maximizing else _UNKNOWN[1]
+    for m in moves:
+        rest = list(groups)
+        if m == -1:
+            if top - unit:
+                rest.extend(_canon(n, top - unit))
+            new_top, new_pile = 0, 0
+            gain = pile + 1 if maximizing else -(pile + 1)
+        else:
+            rest.remove(m)
+            if top:
+                rest.extend(_canon(n, top))
+            new_top, new_pile, gain = m - unit, pile + 1, 0
+        rest.sort()
+        v, _ = _search(n, me, nxt, tuple(rest), new_top, new_pile, alpha - gain, beta - gain)
+        v += gain
+        if maximizing:
+            if v > best:
+                best, best_move = v, m
+            alpha = max(alpha, v)
+        else:
+            if v < best:
+                best, best_move = v, m
+            beta = min(beta, v)
+        if alpha >= beta:
+            break
+
+    if best <= a0:
+        hi = best
+    elif best >= b0:
+        lo = best
+    else:
+        lo = hi = best
+    known[pile] = (lo, hi, best_move)
+    return best, best_move
+
+
+def _mtdf(n, me, turn, groups, top, pile, cards):
+    """Bisect on the value with null-window searches; bounds accumulate in the TT."""
+    if len(_tt) >= TT_MAX:
+        _tt.clear()
+    move = None
+    lo, hi = -(pile + cards), pile + cards   # nobody can win more than everything
+    while lo < hi:
+        beta = (lo + hi + 1) // 2
+        g, m = _search(n, me, turn, groups, top, pile, beta - 1, beta, root=True)
+        if g < beta:
+            hi = g
+            if me != turn:
+                move = m   # a fail-low at a min node is achieved by this move
+        else:
+            lo = g
+            if me == turn:
+                move = m   # likewise a fail-high at a max node
+    return lo, move
+
+
+def solve(hands, table, turn, me=None):
+    """Perfect play from here to the end of the deal.
+
+    hands: every player's hand (lists of {'r', 's'}), in seat order.
+    table: the face-up pile, top card last. turn: whose move it is.
+    me: whose points to maximise (defaults to the player on turn).
+    Returns (value, rank) - value is me's points minus everyone else's over
+    the rest of the deal, rank the card rank the player on turn should play.
+    The seats from `turn` on must hold k cards and the rest k - 1, as dealt.
+    """
+    n = len(hands)
+    sizes = [len(hands[(turn + i) % n]) for i in range(n)]
+    if not sizes[0] or sizes != sorted(sizes, reverse=True) or sizes[0] - sizes[-1] > 1:
+        raise ValueError("not a position play_card can reach")
+    me = turn if me is None else me
+    by_rank = profiles(hands)
+    top_rank = table[-1]['r'] if table else None
+    top = by_rank.pop(top_rank, 0)
+    groups = tuple(sorted(q for p in by_rank.values() for q in _canon(n, p)))
+    value, move = _mtdf(n, me, turn, groups, top, len(table), sum(sizes))
+    if move == -1:
+        return value, top_rank
+    if move is None:   # nothing left to fight over: any card will do
+        return value, hands[turn][0]['r']
+    return value, next(r for r, p in by_rank.items() if p >> (BITS * turn) & MASK and move in _canon(n, p))
+
+
+def best_index(hands, table, turn):
+    """Index into hands[turn] of a perfect-play card."""
+    _, rank = solve(hands, table, turn)
+    return next(i for i, c in enumerate(hands[turn]) if c['r'] == rank)
+
+
+def clear():
+    _tt.clear()